@@ -0,0 +1,300 @@
+"""Headless batch pricing: prices trip specs from a CSV or JSON file.
+
+    python batch.py trips.json --out results/ [--docx] [--workers N] [--rates-source db]
+
+JSON input is a list of trips:
+
+    {"id": "T1", "client": "Smith", "country": "Kenya",
+     "start": "2026-06-14", "end": "2026-06-19", "adults": 2, "children": [5, 12],
+     "vehicles": 1, "child_seats": 2,
+     "camps": [{"loc": "Masai Mara", "type": "Tented Camp", "prop": "...", "nights": 3,
+                "rooms": {"Double": [["Adult 1", "Adult 2"]], "Triple": [["Child 1", "Child 2"]]}}],
+     "extras": [{"name": "Balloon", "a_price": 450, "a_sel": ["Adult 1"],
+                 "c_price": 0, "c_sel": [], "dyn_c": false, "dyn_prices": {}}]}
+
+CSV input has one row per camp; rows sharing an `id` make up one trip and
+the trip columns are read from its first row. Children are ages separated
+by ';', rooms are separated by '|' and occupants by '+' (e.g. a `double`
+column of "Adult 1+Adult 2|Child 1+Child 2"), and `extras` is optional JSON.
+
+A camp's rooms can be "auto" (a `rooms` column of "auto" in CSV) to get
+the cheapest valid allocation from pricing.assign_camp_rooms. Children
+then always share with an adult unless the trip has "chaperone": false,
+and "families" (lists of travelers; '|' and '+' separated in CSV) only
+share rooms among themselves.
+
+Travelers are named as on the quote form: "Adult 1", "Child 1" or
+"Child 1 (Age 5)". Trips are priced with pricing.price_trip, so the rules
+are the same as GENERATE CALCULATION. Writes totals.csv, travelers.csv
+and, with --docx, one quotation per priced trip.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from rates import load_country_rates, RATES_SOURCE
+from pricing import (price_trip, price_table, build_itinerary, assign_camp_rooms, PricingError, ROOM_TYPES,
+                     ROOM_CAPACITY, TravelerRegistry, AIRPORT_MAP)
+
+TOTALS_COLUMNS = ["id", "client", "country", "start", "end", "adults", "children", "status", "total", "problems"]
+TRAVELER_COLUMNS = ["id", "label", "category", "age", "acc", "park", "veh", "comm", "extra", "total"]
+
+
+# --- INPUT ---
+def _parse_date(value):
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised date {value!r} (use YYYY-MM-DD or DD/MM/YYYY)")
+
+
+def _split(value, sep):
+    return [part.strip() for part in str(value or "").split(sep) if part.strip()]
+
+
+def read_csv_trips(path):
+    """Trip specs from a CSV with one row per camp."""
+    trips = {}
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        for row in csv.DictReader(fh):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            trip = trips.get(row["id"])
+            if trip is None:
+                trip = trips[row["id"]] = {
+                    "id": row["id"], "client": row.get("client") or "Guest", "country": row["country"],
+                    "start": row["start"], "end": row["end"], "adults": int(row["adults"]),
+                    "children": [int(a) for a in _split(row.get("children"), ";")],
+                    "vehicles": int(row["vehicles"]) if row.get("vehicles") else None,
+                    "extras": json.loads(row["extras"]) if row.get("extras") else [],
+                    "camps": [],
+                }
+                if row.get("child_seats"):
+                    trip["child_seats"] = int(row["child_seats"])
+                if row.get("families"):
+                    trip["families"] = [_split(family, "+") for family in _split(row["families"], "|")]
+            rooms = {r_type: [_split(room, "+") for room in _split(row.get(r_type.lower()), "|")] for r_type in ROOM_TYPES}
+            trip["camps"].append({
+                "loc": row["loc"], "type": row["type"], "prop": row["prop"], "nights": int(row["nights"]),
+                "rooms": "auto" if (row.get("rooms") or "").lower() == "auto" else rooms,
+            })
+    return list(trips.values())
+
+
+def read_trips(path):
+    """Trip specs from a .json (list of trips) or .csv file."""
+    if path.lower().endswith(".csv"):
+        return read_csv_trips(path)
+    with open(path, encoding="utf-8") as fh:
+        trips = json.load(fh)
+    return trips["trips"] if isinstance(trips, dict) else trips
+
+
+# --- PRICING ---
+def _traveler_ids(registry, names):
+    # Accept the form's labels ("Child 1 (Age 5)") as well as plain names ("Child 1")
+    by_name = {t.name: t.id for t in registry}
+    by_label = {t.label: t.id for t in registry}
+    ids = []
+    for name in names:
+        name = str(name).strip()
+        if name not in by_label and name not in by_name:
+            raise PricingError([f"Unknown traveler {name!r}"])
+        ids.append(by_label.get(name, by_name.get(name)))
+    return ids
+
+
+def build_trip(spec, tables):
+    """The price_trip input for a spec, with the quote form's checks applied."""
+    problems = []
+    start, end = _parse_date(spec["start"]), _parse_date(spec["end"])
+    if end < start:
+        raise PricingError(["End Date cannot be before Start Date"])
+    total_nights = (end - start).days
+
+    registry = TravelerRegistry.build(int(spec["adults"]), spec.get("children", []), tables["child_index"])
+    seated = int(spec["adults"]) + int(spec.get("child_seats", len(spec.get("children", []))))
+    min_vehicles = math.ceil(seated / 6)
+    vehicles = int(spec.get("vehicles") or max(1, min_vehicles))
+    if vehicles < min_vehicles:
+        problems.append(f"You need at least {min_vehicles} vehicles for {seated} seated travelers")
+
+    families = [_traveler_ids(registry, family) for family in spec.get("families", [])]
+    camps = []
+    camp_start = start
+    for n, camp in enumerate(spec["camps"], start=1):
+        if camp.get("rooms") == "auto":
+            try:
+                assignments, _ = assign_camp_rooms(tables, camp, camp_start, registry, families,
+                                                   chaperone=spec.get("chaperone", True))
+            except PricingError as err:
+                problems.extend(f"Camp {n}: {problem}" for problem in err.problems)
+                assignments = {r_type: [] for r_type in ROOM_TYPES}
+        else:
+            assignments = {r_type: [_traveler_ids(registry, room) for room in camp.get("rooms", {}).get(r_type, [])]
+                           for r_type in ROOM_TYPES}
+            for r_type, rooms in assignments.items():
+                if any(len(room) > ROOM_CAPACITY[r_type] for room in rooms):
+                    problems.append(f"Camp {n}: Max {ROOM_CAPACITY[r_type]} allowed for {r_type}")
+            assigned = [t for rooms in assignments.values() for room in rooms for t in room]
+            if sorted(assigned) != list(range(len(registry))):
+                problems.append(f"Camp {n}: every traveler must be in exactly one room")
+        camp_start += timedelta(days=int(camp["nights"]))
+        camps.append({"loc": camp["loc"], "type": camp["type"], "prop": camp["prop"],
+                      "nights": int(camp["nights"]), "assignments": assignments})
+    planned = sum(c["nights"] for c in camps)
+    if planned != total_nights:
+        problems.append(f"Camps cover {planned} nights but the trip has {total_nights}")
+
+    extras = []
+    for item in spec.get("extras", []):
+        extras.append({
+            "name": item.get("name", ""), "a_price": float(item.get("a_price", 0)), "c_price": float(item.get("c_price", 0)),
+            "a_sel": _traveler_ids(registry, item.get("a_sel", [])), "c_sel": _traveler_ids(registry, item.get("c_sel", [])),
+            "dyn_c": bool(item.get("dyn_c")),
+            "dyn_prices": dict(zip(_traveler_ids(registry, item.get("dyn_prices", {})),
+                                   map(float, item.get("dyn_prices", {}).values()))),
+        })
+    if problems:
+        raise PricingError(problems)
+    return {"start": start, "end": end, "vehicles": vehicles, "travelers": registry, "camps": camps, "extras": extras}
+
+
+def _join_names(names):
+    return ", ".join(names[:-1]) + " and " + names[-1] if len(names) > 1 else (names[0] if names else "")
+
+
+def quote_config(spec, trip, result):
+    """The Word quotation config for a priced trip, as Prepare Word Document builds it."""
+    client = spec.get("client") or "Guest"
+    country = spec["country"]
+    start, end = trip["start"], trip["end"]
+    stays = []
+    for camp in trip["camps"]:
+        rooms = [f"{len(camp['assignments'][r_type])} {r_type} Room(s)" for r_type in ROOM_TYPES if camp["assignments"][r_type]]
+        stays.append(f"{_join_names(rooms)} at {camp['prop']} for {camp['nights']} night(s)")
+    children = len(spec.get("children", []))
+    return {
+        "client": client,
+        "total": result["total"],
+        "pp": result["total"] / int(spec["adults"]) if not children else 0,
+        "adults": int(spec["adults"]),
+        "children_count": children,
+        "price_table": price_table(result),
+        "country": country,
+        "iti": build_itinerary(trip["camps"], AIRPORT_MAP.get(country, "Nairobi")),
+        "start": start.strftime("%d/%m/%Y"),
+        "end": end.strftime("%d/%m/%Y"),
+        "pkg": f"{result['days']}D/{(end - start).days}N",
+        "vehicles": trip["vehicles"],
+        "accommodation_summary": ", ".join(stays),
+        "extras_summary": _join_names([item["name"].strip() for item in trip["extras"] if item["name"].strip()]),
+        "detailed_iti": [],
+        "code": f"{country[:3].upper()}-{client[:3].replace(' ', '').upper()}-{start.strftime('%d%m%Y')}",
+    }
+
+
+def price_spec(spec, rates_dir=".", docx_dir=None, rates_source=None):
+    """Prices one trip spec; never raises, so one bad row cannot stop a batch."""
+    summary = {"id": spec.get("id"), "client": spec.get("client") or "Guest", "country": spec.get("country"),
+               "start": spec.get("start"), "end": spec.get("end"), "adults": spec.get("adults"),
+               "children": ";".join(str(a) for a in spec.get("children", [])),
+               "status": "ok", "total": "", "problems": ""}
+    travelers = []
+    try:
+        tables = load_country_rates(spec["country"], rates_dir, rates_source)
+        if tables is None:
+            if (rates_source or RATES_SOURCE) == "db":
+                raise PricingError([f"No published rates for {spec['country']}"])
+            raise PricingError([f"No rate workbook {os.path.join(rates_dir, spec['country'] + '.xlsx')}"])
+        trip = build_trip(spec, tables)
+        result = price_trip(tables, trip)
+        summary["total"] = result["total"]
+        per = result["travelers"]
+        for row in per.itertuples(index=False):
+            travelers.append({"id": summary["id"], "label": row.label, "category": row.category,
+                              "age": "" if row.category == "Adult" else int(row.age),
+                              **{col: round(float(getattr(row, col)), 2) for col in ("acc", "park", "veh", "comm", "extra")},
+                              "total": int(row.total)})
+        if docx_dir:
+            from file import generate_word_quotation
+            q = quote_config(spec, trip, result)
+            with open(os.path.join(docx_dir, f"Quote_{q['code']}_{summary['id']}.docx".replace("/", "-")), "wb") as fh:
+                fh.write(generate_word_quotation(q))
+    except PricingError as err:
+        summary.update(status="error", problems=" | ".join(err.problems))
+    except (KeyError, ValueError, TypeError) as err:
+        summary.update(status="error", problems=f"Invalid trip spec: {err!r}")
+    return summary, travelers
+
+
+def _price_chunk(specs, rates_dir, docx_dir, rates_source):
+    return [price_spec(spec, rates_dir, docx_dir, rates_source) for spec in specs]
+
+
+def price_batch(specs, rates_dir=".", docx_dir=None, workers=None, chunk_size=8, rates_source=None):
+    """Yields (summary, traveler rows) per spec, in input order, priced on all cores.
+
+    Specs are sent in chunks so each worker loads a country's rate tables
+    once (rates.load_country_rates) and reuses them for the rest of the batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [specs[i:i + chunk_size] for i in range(0, len(specs), chunk_size)]
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            yield from _price_chunk(chunk, rates_dir, docx_dir, rates_source)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        n = len(chunks)
+        for results in pool.map(_price_chunk, chunks, [rates_dir] * n, [docx_dir] * n, [rates_source] * n):
+            yield from results
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price safari trips in bulk against the country rate workbooks.")
+    parser.add_argument("input", help="trip specs (.json or .csv)")
+    parser.add_argument("--out", default="batch_output", help="output directory (default: batch_output)")
+    parser.add_argument("--rates-dir", default=".", help="folder holding {Country}.xlsx (default: .)")
+    parser.add_argument("--rates-source", choices=["files", "db"], default=None,
+                        help="read rates from the workbooks or the current versions in Postgres (default: $RATES_SOURCE or files)")
+    parser.add_argument("--docx", action="store_true", help="also write a Word quotation per priced trip")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    specs = read_trips(args.input)
+    os.makedirs(args.out, exist_ok=True)
+    docx_dir = None
+    if args.docx:
+        docx_dir = os.path.join(args.out, "docx")
+        os.makedirs(docx_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    priced = failed = 0
+    with open(os.path.join(args.out, "totals.csv"), "w", newline="") as totals_fh, \
+            open(os.path.join(args.out, "travelers.csv"), "w", newline="") as travelers_fh:
+        totals = csv.DictWriter(totals_fh, TOTALS_COLUMNS)
+        travelers = csv.DictWriter(travelers_fh, TRAVELER_COLUMNS)
+        totals.writeheader(); travelers.writeheader()
+        batch = price_batch(specs, args.rates_dir, docx_dir, args.workers, rates_source=args.rates_source)
+        for summary, rows in batch:
+            totals.writerow(summary)
+            travelers.writerows(rows)
+            if summary["status"] == "ok":
+                priced += 1
+            else:
+                failed += 1
+                print(f"{summary['id']}: {summary['problems']}", file=sys.stderr)
+    print(f"Priced {priced} trip(s), {failed} failed, in {time.perf_counter() - started:.1f}s -> {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""Benchmarks for the hot paths: rate loading, pricing, quotation rendering and the quotes table.
+
+    python bench.py                          # every suite that can run here
+    python bench.py rates pricing --quick    # smaller grid, fewer repeats
+    BENCH_DATABASE_URL=postgresql://... python bench.py db --db-sizes 10000,100000,1000000
+
+The db suite only runs against BENCH_DATABASE_URL, which must be a scratch
+database: it runs the migrations, seeds rows under country 'Benchland' and
+deletes them afterwards.
+
+Each run is appended to .bench/history.jsonl with the git revision, and
+compared with the last run on the same host and mode; cases whose median is
+more than --threshold percent slower are flagged and the exit code is 1.
+The report is also written to bench_output.txt.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import rates
+from rates import RATE_SHEETS, DATE_COLUMNS, compile_workbook, load_rate_tables, clear_rate_cache
+from pricing import price_trip, price_calendar, auto_assign_rooms
+from tests.conftest import TRIP_START, bookable_camps, make_quote, make_trip
+
+SUITES = ["rates", "pricing", "docx", "db"]
+HISTORY_PATH = os.path.join(".bench", "history.jsonl")
+REPORT_PATH = "bench_output.txt"
+BENCH_COUNTRY = "Benchland"
+
+
+# --- TIMING ---
+def measure(fn, repeat=5, setup=None, warmup=True):
+    """Median and min wall time of fn() in ms; `setup` runs untimed before every call."""
+    if warmup:
+        if setup: setup()
+        fn()
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3), "repeat": repeat}
+
+
+class Recorder:
+    """Collects results as {"suite/case": {...}} and prints each one as it lands."""
+
+    def __init__(self, repeat_scale=1.0):
+        self.results = {}
+        self.repeat_scale = repeat_scale
+
+    def run(self, suite, case, fn, repeat=5, **kwargs):
+        repeat = max(1, int(round(repeat * self.repeat_scale)))
+        try:
+            result = measure(fn, repeat=repeat, **kwargs)
+        except Exception as err:  # a broken case is recorded, not fatal
+            result = {"error": f"{type(err).__name__}: {err}"}
+        self.results[f"{suite}/{case}"] = result
+        shown = result.get("error") or f"{result['median_ms']:>10.3f} ms  (min {result['min_ms']:.3f}, n={result['repeat']})"
+        print(f"  {suite:<8} {case:<44} {shown}", flush=True)
+        return result
+
+
+# --- SYNTHETIC DATA ---
+def make_synthetic_workbook(src, dst, copies=1, years=1):
+    """Writes a bigger copy of a country workbook.
+
+    Every property is repeated `copies` times (" #2", " #3", ...) and all
+    seasons and park fees are repeated for `years` consecutive years.
+    """
+    sheets = pd.read_excel(src, sheet_name=None)
+    acc_sheet, park_sheet, child_sheet = RATE_SHEETS["acc"], RATE_SHEETS["park"], RATE_SHEETS["child"]
+
+    def shifted(df, columns):
+        frames = []
+        for year in range(years):
+            part = df.copy()
+            for col in columns:
+                part[col] = pd.to_datetime(part[col]) + pd.DateOffset(years=year)
+            frames.append(part)
+        return pd.concat(frames, ignore_index=True)
+
+    def renamed(df):
+        frames = [df]
+        for n in range(2, copies + 1):
+            part = df.copy()
+            part["Property"] = part["Property"].astype(str) + f" #{n}"
+            frames.append(part)
+        return pd.concat(frames, ignore_index=True)
+
+    sheets[acc_sheet] = shifted(renamed(sheets[acc_sheet]), DATE_COLUMNS["acc"])
+    if park_sheet in sheets:
+        sheets[park_sheet] = shifted(sheets[park_sheet], DATE_COLUMNS["park"])
+    if child_sheet in sheets:
+        sheets[child_sheet] = renamed(sheets[child_sheet])
+    with pd.ExcelWriter(dst, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return dst
+
+
+# --- SUITES ---
+def bench_rates(rec, workdir, quick):
+    sources = [(name, f"{name}.xlsx") for name in ("Kenya", "Tanzania") if os.path.exists(f"{name}.xlsx")]
+    for copies in ([10] if quick else [10, 100]):
+        path = os.path.join(workdir, f"Synthetic_x{copies}.xlsx")
+        make_synthetic_workbook("Kenya.xlsx", path, copies=copies, years=2)
+        sources.append((f"Kenya x{copies} props x2 years", path))
+
+    for name, path in sources:
+        rec.run("rates", f"{name}: parse workbook", lambda: compile_workbook(path), repeat=3)
+        rec.run("rates", f"{name}: pickle sidecar", lambda: load_rate_tables(path), repeat=5, setup=clear_rate_cache)
+        rec.run("rates", f"{name}: in-process cache", lambda: load_rate_tables(path), repeat=200)
+
+
+def bench_pricing(rec, workdir, quick):
+    path = os.path.join(workdir, "Synthetic_pricing.xlsx")
+    make_synthetic_workbook("Kenya.xlsx", path, copies=1, years=2)
+    tables = load_rate_tables(path)
+    grid_nights = [7, 30] if quick else [7, 30, 90]
+    grid_travelers = [2, 10] if quick else [2, 10, 40]
+    grid_camps = [1, 3] if quick else [1, 3, 6]
+    camps = bookable_camps(tables, max(grid_nights))
+    if not camps:
+        print("  pricing  no camp prices cleanly over the benchmark window; skipped")
+        return
+    for nights in grid_nights:
+        for n_travelers in grid_travelers:
+            for n_camps in grid_camps:
+                trip = make_trip(tables, camps, nights, n_travelers, n_camps)
+                rec.run("pricing", f"{nights} nights x {n_travelers} pax x {n_camps} camps",
+                        lambda: price_trip(tables, trip), repeat=5)
+    for n_travelers in grid_travelers:
+        trip = make_trip(tables, camps, 7, n_travelers, 3)
+        rec.run("pricing", f"auto-assign rooms {n_travelers} pax x 3 camps",
+                lambda: auto_assign_rooms(tables, trip), repeat=5)
+        rec.run("pricing", f"date sweep 365 starts x 7 nights x {n_travelers} pax",
+                lambda: price_calendar(tables, trip, TRIP_START, 365), repeat=3)
+
+
+def bench_docx(rec, workdir, quick):
+    import file
+    sizes = [(7, 4), (30, 40)] if quick else [(7, 4), (30, 40), (120, 200)]
+
+    def cold():
+        file._base_template = None
+        file._image_cache.clear()
+    rec.run("docx", "word first render (template + logo)", lambda: file.generate_word_quotation(make_quote(7, 4)),
+            repeat=2, setup=cold, warmup=False)
+    for days, travelers in sizes:
+        q = make_quote(days, travelers)
+        rec.run("docx", f"word {days} days x {travelers} price rows", lambda: file.generate_word_quotation(q), repeat=5)
+        rec.run("docx", f"pdf {days} days x {travelers} price rows", lambda: file.generate_pdf_quotation(q), repeat=5)
+
+
+def bench_db(rec, workdir, quick, sizes):
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        print("  db       BENCH_DATABASE_URL not set; skipped")
+        return
+    os.environ["DATABASE_URL"] = url
+    import database
+    database.DATABASE_URL = url
+    database.init_db()
+    config = make_quote(7, 4)
+
+    def seed(upto):
+        with database.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT count(*) FROM quotes WHERE country = %s", (BENCH_COUNTRY,))
+            have = cur.fetchone()[0]
+            if have < upto:
+                cur.execute("""INSERT INTO quotes (client_name, country, date_generated, config_json, tour_code, travel_start, travel_end)
+                               SELECT 'Bench Client ' || g, %s, to_char(now(), 'DD/MM/YYYY HH24:MI'), %s::jsonb,
+                                      'BEN-' || g, DATE '2026-01-01' + (g %% 730), DATE '2026-01-01' + (g %% 730) + 7
+                               FROM generate_series(%s, %s) g""",
+                            (BENCH_COUNTRY, json.dumps(config), have + 1, upto))
+                cur.execute("ANALYZE quotes")
+            cur.close()
+
+    saved = []
+    try:
+        for size in sizes:
+            started = time.perf_counter()
+            seed(size)
+            print(f"  db       seeded {size:,} rows in {time.perf_counter() - started:.1f}s")
+            label = f"{size:,} rows"
+            rec.run("db", f"{label}: search first page", lambda: database.search_quotes(""), repeat=20)
+            rec.run("db", f"{label}: search client substring", lambda: database.search_quotes("Client 4321"), repeat=20)
+            rec.run("db", f"{label}: search tour code", lambda: database.search_quotes("BEN-99"), repeat=20)
+            rows, next_cursor, _ = database.search_quotes("")
+            rec.run("db", f"{label}: search next page", lambda: database.search_quotes("", after_id=next_cursor), repeat=20)
+            counter = iter(range(10 ** 9))
+
+            def save_new():
+                saved.append(database.save_quote_data("Bench Saver", BENCH_COUNTRY, {**config, "code": f"BENSAVE-{size}-{next(counter)}"}))
+            rec.run("db", f"{label}: save new quote", save_new, repeat=20)
+            rec.run("db", f"{label}: save existing tour code",
+                    lambda: database.save_quote_data("Bench Saver", BENCH_COUNTRY, {**config, "code": f"BENSAVE-{size}-0"}), repeat=20)
+    finally:
+        with database.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM quotes WHERE country = %s", (BENCH_COUNTRY,))
+            cur.close()
+        database.close_pool()
+
+
+# --- HISTORY ---
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return rev + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_run(history_path, host, quick):
+    if not os.path.exists(history_path):
+        return None
+    last = None
+    with open(history_path) as fh:
+        for line in fh:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue
+            if run.get("host") == host and run.get("quick") == quick:
+                last = run
+    return last
+
+
+def compare(results, previous, threshold):
+    """Report lines against the previous run and the list of regressed cases."""
+    lines, regressions = [], []
+    for key, result in results.items():
+        old = (previous or {}).get("results", {}).get(key, {})
+        note = ""
+        if "median_ms" in result and "median_ms" in old and old["median_ms"] > 0:
+            change = (result["median_ms"] / old["median_ms"] - 1) * 100
+            note = f"{change:+7.1f}% vs {previous['revision']}"
+            # Sub-millisecond cases are too noisy to flag
+            if change > threshold and result["median_ms"] - old["median_ms"] > 0.5:
+                note += "  <-- REGRESSION"
+                regressions.append(key)
+        shown = result.get("error") or f"{result['median_ms']:>10.3f} ms"
+        lines.append(f"{key:<62} {shown}  {note}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the planner's hot paths and track regressions.")
+    parser.add_argument("suites", nargs="*", help=f"suites to run (default: all of {', '.join(SUITES)})")
+    parser.add_argument("--quick", action="store_true", help="smaller grids and fewer repeats")
+    parser.add_argument("--db-sizes", default="10000,100000,1000000", help="comma separated quote counts to seed")
+    parser.add_argument("--threshold", type=float, default=25.0, help="percent slowdown reported as a regression")
+    parser.add_argument("--history", default=HISTORY_PATH, help=f"results history (default: {HISTORY_PATH})")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    args = parser.parse_args(argv)
+    suites = args.suites or SUITES
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+    db_sizes = [int(n) for n in args.db_sizes.split(",") if n.strip()]
+    if args.quick:
+        db_sizes = db_sizes[:1]
+
+    rec = Recorder(repeat_scale=0.4 if args.quick else 1.0)
+    workdir = tempfile.mkdtemp(prefix="jaws_bench_")
+    # Keep the synthetic workbooks' sidecars out of the app's cache folder
+    saved_cache_dir, rates.CACHE_DIR = rates.CACHE_DIR, os.path.join(workdir, "rates_cache")
+    started = time.perf_counter()
+    try:
+        for suite in suites:
+            print(f"[{suite}]", flush=True)
+            if suite == "rates":
+                bench_rates(rec, workdir, args.quick)
+            elif suite == "pricing":
+                bench_pricing(rec, workdir, args.quick)
+            elif suite == "docx":
+                bench_docx(rec, workdir, args.quick)
+            elif suite == "db":
+                bench_db(rec, workdir, args.quick, db_sizes)
+    finally:
+        rates.CACHE_DIR = saved_cache_dir
+        clear_rate_cache()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    host = platform.node()
+    run = {"revision": git_revision(), "timestamp": datetime.now().isoformat(timespec="seconds"), "host": host,
+           "python": platform.python_version(), "quick": args.quick, "suites": suites, "results": rec.results}
+    previous = previous_run(args.history, host, args.quick)
+    lines, regressions = compare(rec.results, previous, args.threshold)
+    header = [f"bench {run['revision']} on {host} at {run['timestamp']} ({time.perf_counter() - started:.0f}s)",
+              f"compared with {previous['revision']} from {previous['timestamp']}" if previous else "no previous run to compare with"]
+    report = "\n".join(header + lines + [f"{len(regressions)} regression(s) over {args.threshold:.0f}%"])
+    print("\n" + report)
+    with open(REPORT_PATH, "w") as fh:
+        fh.write(report + "\n")
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+        with open(args.history, "a") as fh:
+            fh.write(json.dumps(run) + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,59 +1,929 @@
 import psycopg2
+import pandas as pd
+from psycopg2 import pool
+from psycopg2.extras import Json, execute_values
 import os
-from datetime import datetime
 import json
+import zlib
+import queue
+import atexit
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from timing import timed, span
 
 # Railway provides DATABASE_URL automatically from your Variables screen
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# --- CONNECTION POOL SETTINGS ---
+# One pool is shared by every Streamlit session in this server process.
+# Up to DB_POOL_MIN idle connections are kept open between reruns.
+POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN", "2"))
+POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX", "10"))
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Idle connections older than this get a "SELECT 1" before being handed out
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+_last_used = {}
+_pool_stats = {"checkouts": 0, "in_use": 0, "waits": 0, "pings": 0, "reconnects": 0}
+
+
+def get_pool():
+    """Creates the process-wide pool on first use and returns it."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # sslmode='require' is necessary for secure Railway connections
+                _pool = pool.ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, DATABASE_URL, sslmode='require')
+    return _pool
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.time() - last_used < POOL_PING_AFTER:
+        return True
+    with _pool_lock:
+        _pool_stats["pings"] += 1
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+@contextmanager
 def get_connection():
-    # sslmode='require' is necessary for secure Railway connections
-    return psycopg2.connect(DATABASE_URL, sslmode='require')
+    """Borrows a pooled connection, commits on success and always returns it."""
+    if not _pool_slots.acquire(blocking=False):
+        with _pool_lock:
+            _pool_stats["waits"] += 1
+        if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+            raise pool.PoolError(f"No database connection free after {POOL_TIMEOUT:.0f}s")
+    # The slot is released whatever fails below, even creating the pool or reconnecting
+    try:
+        p = get_pool()
+        conn = None
+        try:
+            conn = p.getconn()
+            if not _is_healthy(conn):
+                # Stale/broken socket (e.g. Railway idle timeout): drop it and reconnect
+                with _pool_lock:
+                    _pool_stats["reconnects"] += 1
+                _last_used.pop(id(conn), None)
+                p.putconn(conn, close=True)
+                conn = None
+                conn = p.getconn()
+            with _pool_lock:
+                _pool_stats["checkouts"] += 1
+                _pool_stats["in_use"] += 1
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                with _pool_lock:
+                    _pool_stats["in_use"] -= 1
+        finally:
+            if conn is not None:
+                if conn.closed:
+                    _last_used.pop(id(conn), None)
+                else:
+                    _last_used[id(conn)] = time.time()
+                p.putconn(conn, close=bool(conn.closed))
+    finally:
+        _pool_slots.release()
 
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
+
+def pool_stats():
+    """Snapshot of the pool for the admin/debug views."""
+    stats = dict(_pool_stats)
+    stats["min"], stats["max"] = POOL_MIN_CONN, POOL_MAX_CONN
+    stats["idle"] = len(_pool._pool) if _pool is not None else 0
+    return stats
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+
+# --- SCHEMA MIGRATIONS ---
+# Each step runs once, in order, and is recorded in schema_version.
+# Steps are written to be safe on databases created before this table existed.
+
+def _m1_create_quotes(cur):
     # Postgres uses SERIAL for auto-incrementing IDs
-    cur.execute('''CREATE TABLE IF NOT EXISTS quotes 
-                 (id SERIAL PRIMARY KEY, 
-                  client_name TEXT, 
-                  country TEXT, 
-                  date_generated TEXT, 
-                  config_json TEXT)''')
-    conn.commit()
-    cur.close()
-    conn.close()
+    cur.execute('''CREATE TABLE IF NOT EXISTS quotes
+                 (id SERIAL PRIMARY KEY,
+                  client_name TEXT,
+                  country TEXT,
+                  date_generated TEXT,
+                  config_json JSONB)''')
+
+def _m2_config_jsonb(cur):
+    # Tables created before JSONB: convert the TEXT column in place
+    cur.execute("""SELECT data_type FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = 'quotes' AND column_name = 'config_json'""")
+    if cur.fetchone()[0] != 'jsonb':
+        cur.execute("ALTER TABLE quotes ALTER COLUMN config_json TYPE JSONB USING config_json::jsonb")
+
+def _m3_search_columns(cur):
+    # Searchable fields as real columns instead of digging through config_json
+    cur.execute("""ALTER TABLE quotes
+                   ADD COLUMN IF NOT EXISTS tour_code TEXT,
+                   ADD COLUMN IF NOT EXISTS travel_start DATE,
+                   ADD COLUMN IF NOT EXISTS travel_end DATE""")
+    cur.execute("""UPDATE quotes SET
+                     tour_code = config_json->>'code',
+                     travel_start = CASE WHEN config_json->>'start' ~ '^\\d{2}/\\d{2}/\\d{4}$'
+                                         THEN to_date(config_json->>'start', 'DD/MM/YYYY') END,
+                     travel_end = CASE WHEN config_json->>'end' ~ '^\\d{2}/\\d{2}/\\d{4}$'
+                                       THEN to_date(config_json->>'end', 'DD/MM/YYYY') END
+                   WHERE tour_code IS NULL AND config_json IS NOT NULL""")
+    # Saved quotes keep their codes even where two share one; step 7 makes new codes unique
+    cur.execute("CREATE INDEX IF NOT EXISTS quotes_country_start_idx ON quotes (country, travel_start)")
+
+def _m4_trigram_indexes(cur):
+    # Trigram indexes make ILIKE '%q%' on client name / tour code an index scan.
+    # Behind a savepoint: a server without pg_trgm still records the step and falls back to seq scans.
+    cur.execute("SAVEPOINT trgm")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cur.execute("CREATE INDEX IF NOT EXISTS quotes_client_name_trgm ON quotes USING gin (client_name gin_trgm_ops)")
+        cur.execute("CREATE INDEX IF NOT EXISTS quotes_tour_code_trgm ON quotes USING gin (tour_code gin_trgm_ops)")
+        cur.execute("RELEASE SAVEPOINT trgm")
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT trgm")
+
+def _m5_render_cache(cur):
+    # Rendered quotation documents, zlib-compressed, keyed by file.render_key()
+    cur.execute("""CREATE TABLE IF NOT EXISTS render_cache
+                   (cache_key TEXT PRIMARY KEY,
+                    format TEXT NOT NULL,
+                    data BYTEA NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_hit TIMESTAMPTZ NOT NULL DEFAULT now())""")
+    cur.execute("CREATE INDEX IF NOT EXISTS render_cache_last_hit_idx ON render_cache (last_hit)")
+
+def _m6_rate_tables(cur):
+    # Rate workbooks as versioned tables: every import is a new rate_versions row,
+    # and exactly one version per country is current (the partial unique index).
+    cur.execute("""CREATE TABLE IF NOT EXISTS rate_versions
+                   (id SERIAL PRIMARY KEY,
+                    country TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    source TEXT,
+                    layout JSONB NOT NULL,
+                    is_current BOOLEAN NOT NULL DEFAULT false,
+                    imported_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    published_at TIMESTAMPTZ,
+                    UNIQUE (country, version))""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS rate_versions_current_key ON rate_versions (country) WHERE is_current")
+    # Date ranges are stored inclusive of Date To, i.e. daterange(from, to, '[]')
+    cur.execute("""CREATE TABLE IF NOT EXISTS acc_rates
+                   (version_id INTEGER NOT NULL REFERENCES rate_versions ON DELETE CASCADE,
+                    row_no INTEGER NOT NULL,
+                    location TEXT NOT NULL,
+                    property TEXT NOT NULL,
+                    room_type TEXT NOT NULL,
+                    season TEXT,
+                    stay DATERANGE NOT NULL,
+                    single_rate DOUBLE PRECISION,
+                    double_rate DOUBLE PRECISION,
+                    triple_rate DOUBLE PRECISION,
+                    PRIMARY KEY (version_id, row_no))""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS park_fees
+                   (version_id INTEGER NOT NULL REFERENCES rate_versions ON DELETE CASCADE,
+                    row_no INTEGER NOT NULL,
+                    location TEXT NOT NULL,
+                    park TEXT,
+                    category TEXT NOT NULL,
+                    ages INT4RANGE,
+                    stay DATERANGE NOT NULL,
+                    fee DOUBLE PRECISION,
+                    PRIMARY KEY (version_id, row_no))""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS child_policies
+                   (version_id INTEGER NOT NULL REFERENCES rate_versions ON DELETE CASCADE,
+                    row_no INTEGER NOT NULL,
+                    location TEXT,
+                    property TEXT NOT NULL,
+                    ages INT4RANGE NOT NULL,
+                    policy TEXT,
+                    form_factor DOUBLE PRECISION,
+                    PRIMARY KEY (version_id, row_no))""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS vehicle_costs
+                   (version_id INTEGER NOT NULL REFERENCES rate_versions ON DELETE CASCADE,
+                    row_no INTEGER NOT NULL,
+                    label TEXT,
+                    cost_per_day DOUBLE PRECISION,
+                    location TEXT,
+                    PRIMARY KEY (version_id, row_no))""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS commissions
+                   (version_id INTEGER NOT NULL REFERENCES rate_versions ON DELETE CASCADE,
+                    row_no INTEGER NOT NULL,
+                    label TEXT,
+                    commission DOUBLE PRECISION,
+                    PRIMARY KEY (version_id, row_no))""")
+    # Range lookups: one GiST index over key + range needs btree_gist for the text columns.
+    # Without it (savepoint, like pg_trgm above) fall back to btree on the key plus GiST on the range.
+    cur.execute("SAVEPOINT btree_gist")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        cur.execute("CREATE INDEX IF NOT EXISTS acc_rates_stay_gist ON acc_rates USING gist (version_id, property, room_type, stay)")
+        cur.execute("CREATE INDEX IF NOT EXISTS park_fees_stay_gist ON park_fees USING gist (version_id, location, category, ages, stay)")
+        cur.execute("RELEASE SAVEPOINT btree_gist")
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT btree_gist")
+        cur.execute("CREATE INDEX IF NOT EXISTS acc_rates_key_idx ON acc_rates (version_id, property, room_type)")
+        cur.execute("CREATE INDEX IF NOT EXISTS acc_rates_stay_gist ON acc_rates USING gist (stay)")
+        cur.execute("CREATE INDEX IF NOT EXISTS park_fees_key_idx ON park_fees (version_id, location, category)")
+        cur.execute("CREATE INDEX IF NOT EXISTS park_fees_stay_gist ON park_fees USING gist (stay)")
+
+def _m7_unique_new_codes(cur):
+    # Rows saved before this step are legacy_code (the column default is stored in the catalog,
+    # so no row is rewritten); new rows default to false and must have a tour code of their own
+    cur.execute("ALTER TABLE quotes ADD COLUMN IF NOT EXISTS legacy_code BOOLEAN NOT NULL DEFAULT true")
+    cur.execute("ALTER TABLE quotes ALTER COLUMN legacy_code SET DEFAULT false")
+    # Earlier builds of step 3 made every tour code unique
+    cur.execute("DROP INDEX IF EXISTS quotes_tour_code_key")
+    cur.execute("CREATE UNIQUE INDEX quotes_tour_code_key ON quotes (tour_code) WHERE NOT legacy_code")
+    cur.execute("CREATE INDEX IF NOT EXISTS quotes_tour_code_idx ON quotes (tour_code)")
 
+MIGRATIONS = [
+    (1, "create quotes", _m1_create_quotes),
+    (2, "config_json as jsonb", _m2_config_jsonb),
+    (3, "tour code and travel date columns", _m3_search_columns),
+    (4, "pg_trgm search indexes", _m4_trigram_indexes),
+    (5, "render cache table", _m5_render_cache),
+    (6, "versioned rate tables", _m6_rate_tables),
+    (7, "unique tour codes for new quotes", _m7_unique_new_codes),
+]
+
+# Arbitrary key for pg_advisory_xact_lock so two app replicas never migrate at once
+_MIGRATION_LOCK_ID = 7310452
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def run_migrations():
+    """Applies pending MIGRATIONS, each in its own transaction. Returns the versions applied."""
+    applied = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""CREATE TABLE IF NOT EXISTS schema_version
+                       (version INTEGER PRIMARY KEY,
+                        name TEXT,
+                        applied_at TIMESTAMPTZ DEFAULT now())""")
+        cur.close()
+    for version, name, step in MIGRATIONS:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MIGRATION_LOCK_ID,))
+            cur.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+            if cur.fetchone() is None:
+                step(cur)
+                cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                applied.append(version)
+            cur.close()
+    return applied
+
+@timed("db.init_db")
+def init_db():
+    """Brings the schema up to date once per server process; later calls are free."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            run_migrations()
+            _schema_ready = True
+            # Saves spooled while the database was unreachable are replayed by the writer
+            if os.path.exists(WRITE_SPOOL_PATH):
+                _start_writer()
+
+def _travel_date(value):
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+def _free_tour_code(cur, tour_code):
+    """`tour_code`, or '<code>-N' with the next free N when saved quotes already use it."""
+    pattern = tour_code.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "-%"
+    cur.execute("SELECT tour_code FROM quotes WHERE tour_code = %s OR tour_code LIKE %s", (tour_code, pattern))
+    taken = {row[0] for row in cur.fetchall()}
+    if tour_code not in taken:
+        return tour_code
+    suffixes = [int(code[len(tour_code) + 1:]) for code in taken if code[len(tour_code) + 1:].isdigit()]
+    return f"{tour_code}-{max(suffixes + [1]) + 1}"
+
+def _save_quote(cur, client_name, country, config_dict, now=None):
+    """Inserts a quote under the first free form of its tour code; returns (id, code).
+
+    Tour codes are built from country, client and start date, so two quotes
+    can share one: the later one is saved as '<code>-N', in the search column
+    and in its config alike. Insert-only: no save overwrites an earlier quote.
+    """
+    now = now or datetime.now().strftime("%d/%m/%Y %H:%M")
+    base_code = config_dict.get('code')
+    start, end = _travel_date(config_dict.get('start')), _travel_date(config_dict.get('end'))
+    while True:
+        tour_code = _free_tour_code(cur, base_code) if base_code else base_code
+        config = config_dict if tour_code == base_code else dict(config_dict, code=tour_code)
+        # Postgres uses %s placeholders instead of ?
+        cur.execute("""INSERT INTO quotes (client_name, country, date_generated, config_json, tour_code, travel_start, travel_end)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)
+                       ON CONFLICT (tour_code) WHERE NOT legacy_code DO NOTHING
+                       RETURNING id""",
+                  (client_name, country, now, Json(config), tour_code, start, end))
+        row = cur.fetchone()
+        if row is not None:
+            return row[0], tour_code
+        # Another server saved the same code since the lookup: find the next free one
+
+@timed("db.save_quote_data")
 def save_quote_data(client_name, country, config_dict):
-    conn = get_connection()
-    cur = conn.cursor()
-    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-    config_str = json.dumps(config_dict)
-    # Postgres uses %s placeholders instead of ?
-    cur.execute("INSERT INTO quotes (client_name, country, date_generated, config_json) VALUES (%s, %s, %s, %s)",
-              (client_name, country, now, config_str))
-    conn.commit()
-    cur.close()
-    conn.close()
+    """Saves a quote as a new row and returns its id.
 
+    If another quote already has the tour code, the new row is stored as
+    '<code>-N' (see _save_quote).
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        quote_id, _ = _save_quote(cur, client_name, country, config_dict)
+        cur.close()
+    return quote_id
+
+@timed("db.delete_quote")
 def delete_quote(quote_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM quotes WHERE id = %s", (quote_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def search_quotes(query):
-    conn = get_connection()
-    cur = conn.cursor()
-    # ILIKE searches both the client_name and the config_json (Tour Code)
-    cur.execute("""
-        SELECT id, client_name, country, date_generated, config_json 
-        FROM quotes 
-        WHERE client_name ILIKE %s OR config_json ILIKE %s
-    """, ('%' + query + '%', '%' + query + '%'))
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
-    return results
\ No newline at end of file
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM quotes WHERE id = %s", (quote_id,))
+        cur.close()
+
+# Rows per page on the Search Database page
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "25"))
+
+@timed("db.search_quotes")
+def search_quotes(query, page_size=SEARCH_PAGE_SIZE, after_id=None, before_id=None):
+    """One page of matching quotes, newest first.
+
+    Keyset pagination on id: pass `after_id` (the last id shown) for the next
+    page or `before_id` (the first id shown) for the previous one. Returns
+    (rows, next_cursor, prev_cursor); rows are (id, client_name, country,
+    date_generated, tour_code) and a cursor is None when there is no page
+    that way. The config blob is not fetched - use get_quote_config.
+    """
+    pattern = '%' + query + '%'
+    if before_id is not None:
+        keyset, order, params = "AND id > %s", "ASC", [before_id]
+    elif after_id is not None:
+        keyset, order, params = "AND id < %s", "DESC", [after_id]
+    else:
+        keyset, order, params = "", "DESC", []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # ILIKE on client_name and tour_code is served by the pg_trgm GIN indexes
+        cur.execute(f"""
+            SELECT id, client_name, country, date_generated, tour_code
+            FROM quotes
+            WHERE (client_name ILIKE %s OR tour_code ILIKE %s) {keyset}
+            ORDER BY id {order}
+            LIMIT %s
+        """, [pattern, pattern] + params + [page_size + 1])
+        results = cur.fetchall()
+        cur.close()
+    has_more = len(results) > page_size
+    results = results[:page_size]
+    if before_id is not None:
+        results.reverse()
+        next_cursor = results[-1][0] if results else None
+        prev_cursor = results[0][0] if has_more else None
+    else:
+        next_cursor = results[-1][0] if has_more else None
+        prev_cursor = results[0][0] if after_id is not None and results else None
+    return results, next_cursor, prev_cursor
+
+@timed("db.get_quote_config")
+def get_quote_config(quote_id):
+    """The saved `q` dict for one quote (decoded by psycopg2 from JSONB), or None."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT config_json FROM quotes WHERE id = %s", (quote_id,))
+        row = cur.fetchone()
+        cur.close()
+    return row[0] if row else None
+
+# --- RENDER CACHE TIER ---
+# Compressed size the render_cache table is trimmed to, least recently hit first
+RENDER_DB_CACHE_MAX_BYTES = int(float(os.getenv("RENDER_DB_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+@timed("db.get_cached_render")
+def get_cached_render(cache_key):
+    """Document bytes cached under `cache_key`, or None."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE render_cache SET last_hit = now() WHERE cache_key = %s RETURNING data", (cache_key,))
+        row = cur.fetchone()
+        cur.close()
+    return zlib.decompress(bytes(row[0])) if row else None
+
+@timed("db.put_cached_render")
+def put_cached_render(cache_key, fmt, data):
+    """Stores a rendered document and trims the table to RENDER_DB_CACHE_MAX_MB."""
+    compressed = zlib.compress(data, 6)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""INSERT INTO render_cache (cache_key, format, data, size) VALUES (%s, %s, %s, %s)
+                       ON CONFLICT (cache_key) DO UPDATE SET last_hit = now()""",
+                    (cache_key, fmt, psycopg2.Binary(compressed), len(compressed)))
+        cur.execute("""DELETE FROM render_cache WHERE cache_key IN (
+                         SELECT cache_key FROM (
+                           SELECT cache_key, sum(size) OVER (ORDER BY last_hit DESC, cache_key) AS kept
+                           FROM render_cache) ranked
+                         WHERE kept > %s)""", (RENDER_DB_CACHE_MAX_BYTES,))
+        cur.close()
+
+# Most quotes one bulk export lists (and so can put in one ZIP)
+EXPORT_MAX_QUOTES = int(os.getenv("EXPORT_MAX_QUOTES", "500"))
+
+@timed("db.find_quotes_for_export")
+def find_quotes_for_export(country=None, start_from=None, start_to=None, limit=EXPORT_MAX_QUOTES):
+    """(id, client_name, country, tour_code, travel_start) of up to `limit` quotes matching the filters, newest first."""
+    conditions, params = [], []
+    if country:
+        conditions.append("country = %s"); params.append(country)
+    if start_from:
+        conditions.append("travel_start >= %s"); params.append(start_from)
+    if start_to:
+        conditions.append("travel_start <= %s"); params.append(start_to)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""SELECT id, client_name, country, tour_code, travel_start
+                        FROM quotes {where} ORDER BY id DESC LIMIT %s""", params + [limit])
+        results = cur.fetchall()
+        cur.close()
+    return results
+
+def iter_quote_configs(quote_ids, batch_size=100):
+    """Yields (id, config dict) for the given ids, fetching `batch_size` configs per query."""
+    quote_ids = list(quote_ids)
+    for i in range(0, len(quote_ids), batch_size):
+        batch = quote_ids[i:i + batch_size]
+        with span("db.iter_quote_configs"), get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id, config_json FROM quotes WHERE id = ANY(%s)", (batch,))
+            configs = dict(cur.fetchall())
+            cur.close()
+        for quote_id in batch:
+            if quote_id in configs:
+                yield quote_id, configs[quote_id]
+
+
+# --- RATE TABLES ---
+# How each rates.RATE_SHEETS sheet maps onto its table: (table, [(sheet column, column)],
+# {range column: (sheet "from" column, sheet "to" column, range type, required)}).
+# Sheet ranges are inclusive at both ends; they are stored as '[]' ranges.
+RATE_TABLES = {
+    "acc": ("acc_rates",
+            [("Location", "location"), ("Property", "property"), ("Room Type", "room_type"), ("Season", "season"),
+             ("Single (Cost Per Person/Per Night)", "single_rate"),
+             ("Double (Cost Per Person/Per Night)", "double_rate"),
+             ("Triple (Cost Per Person/Per Night)", "triple_rate")],
+            {"stay": ("Date From", "Date To", "daterange", True)}),
+    "park": ("park_fees",
+             [("Location", "location"), ("Park Entry Fees", "park"), ("Travellers  Category", "category"),
+              ("Park Fee Per Night Per Person in USD", "fee")],
+             {"stay": ("Dates From", "Dates To", "daterange", True), "ages": ("Age from", "Age to", "int4range", False)}),
+    "comm": ("commissions", [("Jaws Commission", "label"), ("Commission Per Person (USD)", "commission")], {}),
+    "veh": ("vehicle_costs", [("Vehicle Hire", "label"), ("Cost in USD/Per Day", "cost_per_day"), ("Location", "location")], {}),
+    "child": ("child_policies",
+              [("Location", "location"), ("Property", "property"),
+               ("Cost based on adult rates/Per Child", "policy"), ("Form Factor", "form_factor")],
+              {"ages": ("Age From", "Age To", "int4range", True)}),
+}
+
+# Arbitrary key (with the country's hash) for pg_advisory_xact_lock so two imports never race for a version number
+_RATES_LOCK_ID = 7310453
+
+def _column_values(series):
+    # Native Python values for psycopg2: numpy scalars become int/float and missing cells None
+    return [None if value is None or value != value else value for value in series.astype(object).tolist()]
+
+def _insert_rate_sheet(cur, version_id, key, df):
+    table, columns, ranges = RATE_TABLES[key]
+    missing = [col for col, _ in columns if col not in df.columns]
+    missing += [col for lo, hi, _, required in ranges.values() if required for col in (lo, hi) if col not in df.columns]
+    if missing:
+        raise ValueError(f"{key} sheet is missing column(s): {', '.join(missing)}")
+    # A blank bound would silently become an open-ended range
+    blank = [col for lo, hi, _, required in ranges.values() if required for col in (lo, hi) if df[col].isna().any()]
+    if blank:
+        raise ValueError(f"{key} sheet has blank cells in: {', '.join(blank)}")
+    names = ["version_id", "row_no"] + [name for _, name in columns] + list(ranges)
+    values = [[version_id] * len(df), list(range(len(df)))] + [_column_values(df[col]) for col, _ in columns]
+    template = ["%s"] * (2 + len(columns))
+    for lo, hi, kind, _ in ranges.values():
+        if lo in df.columns and hi in df.columns:
+            values += [_column_values(df[lo]), _column_values(df[hi])]
+            cast = "::date" if kind == "daterange" else "::integer"
+            template.append(f"{kind}(%s{cast}, %s{cast}, '[]')")
+        else:
+            template.append("NULL")
+    execute_values(cur, f"INSERT INTO {table} ({', '.join(names)}) VALUES %s",
+                   list(zip(*values)), template=f"({', '.join(template)})", page_size=500)
+
+def _sheet_layout(key, df):
+    # Sheet column order and dtypes, so load_rate_version rebuilds the exact frame the workbook gave
+    table, columns, ranges = RATE_TABLES[key]
+    known = {col for col, _ in columns} | {col for lo, hi, _, _ in ranges.values() for col in (lo, hi)}
+    return [[col, str(df[col].dtype)] for col in df.columns if col in known]
+
+def _make_current(cur, country, version_id):
+    cur.execute("UPDATE rate_versions SET is_current = false WHERE country = %s AND is_current AND id <> %s",
+                (country, version_id))
+    cur.execute("UPDATE rate_versions SET is_current = true, published_at = now() WHERE id = %s", (version_id,))
+
+@timed("db.publish_rate_version")
+def publish_rate_version(country, sheets, source=None, activate=True):
+    """Stores `sheets` ({RATE_SHEETS key: DataFrame}) as the next rate version of `country`.
+
+    The rows and the switch of the current version commit in one
+    transaction, so readers see either the old rates or all of the new
+    ones. With activate=False the version is staged for a later
+    activate_rate_version(). Returns the new version number.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (_RATES_LOCK_ID, country))
+        cur.execute("SELECT coalesce(max(version), 0) + 1 FROM rate_versions WHERE country = %s", (country,))
+        version = cur.fetchone()[0]
+        layout = {key: _sheet_layout(key, df) for key, df in sheets.items() if key in RATE_TABLES}
+        cur.execute("""INSERT INTO rate_versions (country, version, source, layout)
+                       VALUES (%s, %s, %s, %s) RETURNING id""", (country, version, source, Json(layout)))
+        version_id = cur.fetchone()[0]
+        for key, df in sheets.items():
+            if key in RATE_TABLES:
+                _insert_rate_sheet(cur, version_id, key, df)
+        if activate:
+            _make_current(cur, country, version_id)
+        cur.close()
+    return version
+
+def _version_id(cur, country, version):
+    cur.execute("SELECT id FROM rate_versions WHERE country = %s AND version = %s", (country, version))
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"{country} has no rate version {version}")
+    return row[0]
+
+@timed("db.activate_rate_version")
+def activate_rate_version(country, version):
+    """Makes an already imported version current (publishing a staged one or rolling back)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (_RATES_LOCK_ID, country))
+        _make_current(cur, country, _version_id(cur, country, version))
+        cur.close()
+
+def rate_version_id(country, version):
+    """Row id of a country's rate version (what load_rate_version takes)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        version_id = _version_id(cur, country, version)
+        cur.close()
+    return version_id
+
+@timed("db.current_rate_version")
+def current_rate_version(country):
+    """(version id, version number) of the country's current rates, or None."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, version FROM rate_versions WHERE country = %s AND is_current", (country,))
+        row = cur.fetchone()
+        cur.close()
+    return row
+
+def rate_countries():
+    """Countries that have a current rate version."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT country FROM rate_versions WHERE is_current ORDER BY country")
+        countries = [row[0] for row in cur.fetchall()]
+        cur.close()
+    return countries
+
+def list_rate_versions(country=None):
+    """(country, version, source, is_current, imported_at, published_at) of every imported version."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""SELECT country, version, source, is_current, imported_at, published_at FROM rate_versions
+                       WHERE %(country)s IS NULL OR country = %(country)s
+                       ORDER BY country, version""", {"country": country})
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+def _select_list(key, layout):
+    # Table columns aliased back to their sheet names; ranges become their inclusive bounds
+    table, columns, ranges = RATE_TABLES[key]
+    expressions = {col: f'{name} AS "{col}"' for col, name in columns}
+    for name, (lo, hi, _, _) in ranges.items():
+        expressions[lo] = f'lower({name}) AS "{lo}"'
+        expressions[hi] = f'upper({name}) - 1 AS "{hi}"'
+    return ", ".join(expressions[col] for col, _ in layout)
+
+@timed("db.load_rate_version")
+def load_rate_version(version_id):
+    """The sheets of one rate version as {RATE_SHEETS key: DataFrame}, one query per table.
+
+    Frames have the workbook's column names, order and dtypes, so they can
+    go through rates.compile_tables like a freshly read workbook.
+    """
+    sheets = {}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT layout FROM rate_versions WHERE id = %s", (version_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"No rate version with id {version_id}")
+        for key, layout in row[0].items():
+            cur.execute(f"SELECT {_select_list(key, layout)} FROM {RATE_TABLES[key][0]} "
+                        "WHERE version_id = %s ORDER BY row_no", (version_id,))
+            df = pd.DataFrame(cur.fetchall(), columns=[col for col, _ in layout])
+            sheets[key] = df.astype(dict(layout))
+        cur.close()
+    return sheets
+
+@timed("db.rate_season_overlaps")
+def rate_season_overlaps(country, version):
+    """Accommodation seasons of one version that overlap another season of the same room.
+
+    (location, property, room type, first overlapping night, last overlapping night);
+    the compiled index keeps the first row in sheet order for those nights.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""SELECT a.location, a.property, a.room_type,
+                              lower(a.stay * b.stay), upper(a.stay * b.stay) - 1
+                       FROM rate_versions v
+                       JOIN acc_rates a ON a.version_id = v.id
+                       JOIN acc_rates b ON b.version_id = a.version_id AND b.property = a.property
+                                       AND b.room_type = a.room_type AND b.location = a.location
+                                       AND b.row_no > a.row_no AND b.stay && a.stay
+                       WHERE v.country = %s AND v.version = %s
+                       ORDER BY 1, 2, 3, 4""", (country, version))
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+@timed("db.stay_rates")
+def stay_rates(country, stays, version=None):
+    """Rates for every night of several stays, in a single query.
+
+    `stays` is a list of (location, property, room type, first night, nights).
+    Returns (stay index, night, single, double, triple, season) per night;
+    nights outside every season come back with NULL rates. Where seasons
+    overlap the first row in sheet order wins, as in rates.DateIntervalIndex.
+    Uses the current version unless `version` is given.
+
+    Pricing does not call this: it runs on the compiled tables (see
+    rates.load_db_rate_tables). import_rates.py --verify uses it to check
+    that the stored ranges price every night like the compiled index does.
+    """
+    if not stays:
+        return []
+    locations, properties, room_types, firsts, nights = (list(col) for col in zip(*stays))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""WITH v AS (SELECT id FROM rate_versions
+                                  WHERE country = %(country)s
+                                    AND CASE WHEN %(version)s::integer IS NULL THEN is_current
+                                             ELSE version = %(version)s::integer END),
+                            s AS (SELECT * FROM unnest(%(loc)s::text[], %(prop)s::text[], %(room)s::text[],
+                                                       %(first)s::date[], %(nights)s::integer[])
+                                  WITH ORDINALITY AS s(location, property, room_type, first_night, nights, idx))
+                       SELECT s.idx - 1, night::date, r.single_rate, r.double_rate, r.triple_rate, r.season
+                       FROM s
+                       CROSS JOIN LATERAL generate_series(s.first_night, s.first_night + s.nights - 1, interval '1 day') night
+                       LEFT JOIN LATERAL (
+                           SELECT a.single_rate, a.double_rate, a.triple_rate, a.season
+                           FROM acc_rates a, v
+                           WHERE a.version_id = v.id AND a.property = s.property AND a.room_type = s.room_type
+                             AND a.location = s.location AND a.stay @> night::date
+                           ORDER BY a.row_no LIMIT 1) r ON true
+                       ORDER BY 1, 2""",
+                    {"country": country, "version": version, "loc": locations, "prop": properties,
+                     "room": room_types, "first": firsts, "nights": nights})
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+# --- BACKGROUND WRITER ---
+# "Prepare Word Document" hands its save to a writer thread instead of
+# waiting on Postgres. Saves are written in batches (one transaction each),
+# retried with exponential backoff, and appended to a local spool file when
+# the database stays unreachable; the spool is replayed once it is back.
+WRITE_QUEUE_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", "256"))
+WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH", "20"))
+# Attempts per batch before it goes to the spool, and the first backoff in seconds
+WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "4"))
+WRITE_BACKOFF = float(os.getenv("DB_WRITE_BACKOFF", "0.5"))
+WRITE_SPOOL_PATH = os.getenv("DB_WRITE_SPOOL", ".quote_spool.jsonl")
+# How often an idle writer retries the spool file
+SPOOL_RETRY_EVERY = float(os.getenv("DB_SPOOL_RETRY", "30"))
+# Seconds the server waits at exit for queued saves before spooling the rest
+WRITE_EXIT_WAIT = float(os.getenv("DB_WRITE_EXIT_WAIT", "5"))
+# Errors worth retrying; anything else is a bad row and fails on its own
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError)
+
+_write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+_spool_lock = threading.Lock()
+_tickets = itertools.count(1)
+# ticket -> {"state": pending|saved|spooled|failed, "id": ..., "error": ...}; newest 1000 kept
+_save_status = OrderedDict()
+
+
+def _set_status(ticket, **status):
+    with _writer_lock:
+        _save_status[ticket] = status
+        _save_status.move_to_end(ticket)
+        while len(_save_status) > 1000:
+            _save_status.popitem(last=False)
+
+
+def save_status(ticket):
+    """State of a queued save: pending, saved (with `id` and tour `code`), spooled or failed (with `error`)."""
+    with _writer_lock:
+        return dict(_save_status.get(ticket, {"state": "unknown"}))
+
+
+def _spool(items):
+    with _spool_lock, open(WRITE_SPOOL_PATH, "a", encoding="utf-8") as fh:
+        for item in items:
+            fh.write(json.dumps(item) + "\n")
+            fh.flush()
+    for item in items:
+        _set_status(item["ticket"], state="spooled")
+
+
+def _take_spool():
+    """Removes and returns everything in the spool file."""
+    with _spool_lock:
+        if not os.path.exists(WRITE_SPOOL_PATH):
+            return []
+        taking = f"{WRITE_SPOOL_PATH}.{os.getpid()}.replay"
+        os.replace(WRITE_SPOOL_PATH, taking)
+    with open(taking, encoding="utf-8") as fh:
+        items = [json.loads(line) for line in fh if line.strip()]
+    os.remove(taking)
+    return items
+
+
+def _write_batch(items):
+    """Saves items in one transaction, retrying transient errors; spools them if that keeps failing."""
+    delay = WRITE_BACKOFF
+    for attempt in range(WRITE_RETRIES):
+        try:
+            with get_connection() as conn:
+                cur = conn.cursor()
+                saved = [_save_quote(cur, item["client_name"], item["country"], item["config"], item["now"])
+                         for item in items]
+                cur.close()
+        except TRANSIENT_ERRORS:
+            if attempt + 1 < WRITE_RETRIES:
+                time.sleep(delay)
+                delay *= 2
+            continue
+        except psycopg2.Error as err:
+            # A bad row poisons the whole batch: save the rest one by one
+            if len(items) > 1:
+                for item in items:
+                    _write_batch([item])
+            else:
+                _set_status(items[0]["ticket"], state="failed", error=str(err).strip())
+            return True
+        for item, (quote_id, code) in zip(items, saved):
+            _set_status(item["ticket"], state="saved", id=quote_id, code=code)
+        return True
+    _spool(items)
+    return False
+
+
+def _writer_loop():
+    next_spool_retry = 0.0
+    while True:
+        items, in_hand = [], []
+        try:
+            try:
+                items = [_write_queue.get(timeout=SPOOL_RETRY_EVERY)]
+            except queue.Empty:
+                pass
+            while items and len(items) < WRITE_BATCH_SIZE:
+                try:
+                    items.append(_write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            # in_hand is what is neither saved nor on disk yet; _write_batch spools its own failures
+            in_hand = items
+            written = not items or _write_batch(items)
+            in_hand = []
+            if not written:
+                next_spool_retry = time.time() + SPOOL_RETRY_EVERY
+            elif time.time() >= next_spool_retry:
+                in_hand = _take_spool()
+                while in_hand:
+                    written = _write_batch(in_hand[:WRITE_BATCH_SIZE])
+                    in_hand = in_hand[WRITE_BATCH_SIZE:]
+                    if not written:
+                        # Still down: put back what is left and wait for the next round
+                        _spool(in_hand)
+                        in_hand = []
+                        next_spool_retry = time.time() + SPOOL_RETRY_EVERY
+        except Exception as err:
+            # Never let the writer die; whatever was in hand is kept on disk
+            next_spool_retry = time.time() + SPOOL_RETRY_EVERY
+            try:
+                _spool(in_hand)
+            except Exception:
+                for item in in_hand:
+                    _set_status(item["ticket"], state="failed", error=f"Could not save or spool: {err}")
+        finally:
+            for _ in items:
+                _write_queue.task_done()
+
+
+def _start_writer():
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        with _writer_lock:
+            if _writer is None or not _writer.is_alive():
+                _writer = threading.Thread(target=_writer_loop, name="quote-writer", daemon=True)
+                _writer.start()
+
+
+def queue_quote_save(client_name, country, config_dict):
+    """Queues a save for the writer thread and returns a ticket for save_status().
+
+    The config is snapshotted now, so later edits to the dict are not saved.
+    If the queue is full the save goes straight to the spool file.
+    """
+    item = {"ticket": next(_tickets), "client_name": client_name, "country": country,
+            "config": json.loads(json.dumps(config_dict)),
+            "now": datetime.now().strftime("%d/%m/%Y %H:%M")}
+    _set_status(item["ticket"], state="pending")
+    _start_writer()
+    try:
+        _write_queue.put_nowait(item)
+    except queue.Full:
+        _spool([item])
+    return item["ticket"]
+
+
+def flush_writes(timeout=None):
+    """Waits until every queued save has been written or spooled."""
+    deadline = None if timeout is None else time.time() + timeout
+    while _write_queue.unfinished_tasks:
+        if deadline is not None and time.time() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@atexit.register
+def _spool_unwritten():
+    # The writer is a daemon thread: give it a moment to finish, then keep
+    # anything still queued for the next start
+    if _writer is not None and _writer.is_alive():
+        flush_writes(WRITE_EXIT_WAIT)
+    left = []
+    while True:
+        try:
+            left.append(_write_queue.get_nowait())
+        except queue.Empty:
+            break
+    if left:
+        _spool(left)
\ No newline at end of file
@@ -1,14 +1,85 @@
 import io
 import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+import zipfile
+import difflib
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from docx import Document
 from docx.shared import Pt, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import qn, nsdecls
+from xml.sax.saxutils import escape
 from docx.shared import RGBColor
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from fpdf import FPDF
+from PIL import Image
 
-def generate_word_quotation(q):
+from timing import timed
+
+# Printable width of the A4 page inside the 1.27 cm margins
+CONTENT_WIDTH = Cm(18.46)
+
+# --- IMAGE ASSETS (loaded once per process) ---
+LOGO_PATH = "logo.png"
+LOGO_WIDTH = Cm(3.5)
+# Print resolution the logo is downsampled to; 0 keeps the original file
+LOGO_DPI = int(os.getenv("LOGO_DPI", "300"))
+
+_image_cache = {}
+_image_cache_lock = threading.Lock()
+
+def _downsample_png(data, width_px):
+    img = Image.open(io.BytesIO(data))
+    if img.width <= width_px:
+        return data
+    height_px = max(1, round(img.height * width_px / img.width))
+    img = img.resize((width_px, height_px), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+def load_image_asset(path, width=None, dpi=LOGO_DPI):
+    """PNG bytes for `path`, scaled to `width` (a docx Length) at `dpi`.
+
+    Cached per file version, so renders never touch the disk or re-decode
+    the image. Returns None when the file does not exist.
+    """
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    width_px = int(round(width.inches * dpi)) if width is not None and dpi else 0
+    key = (os.path.abspath(path), info.st_mtime_ns, info.st_size, width_px)
+    data = _image_cache.get(key)
+    if data is None:
+        with _image_cache_lock:
+            data = _image_cache.get(key)
+            if data is None:
+                with open(path, "rb") as fh:
+                    data = fh.read()
+                if width_px:
+                    data = _downsample_png(data, width_px)
+                _image_cache[key] = data
+    return data
+
+# --- BASE TEMPLATE (built once per process) ---
+# Page setup, company header, divider and footers are identical for every
+# quote, so they are built once and each render starts from a copy.
+_base_template = None
+_base_template_lock = threading.Lock()
+
+def _build_base_template():
     doc = Document()
     # --- SET GLOBAL FONT TO CALIBRI ---
     style = doc.styles['Normal']
@@ -27,12 +98,10 @@ def generate_word_quotation(q):
     section.header_distance = Cm(0.5)
     section.footer_distance = Cm(0.5)
     
-    content_width = Cm(18.46)
-    
     # --- 2. THE FIXED HEADER ---
     section.different_first_page_header_footer = True
     header = section.first_page_header
-    htable = header.add_table(1, 2, width=content_width)
+    htable = header.add_table(1, 2, width=CONTENT_WIDTH)
     
     htable.allow_autofit = False  
     htable.table_layout = 'fixed' 
@@ -74,8 +143,9 @@ def generate_word_quotation(q):
     right_cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
     logo_para = right_cell.paragraphs[0]
     logo_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT 
-    if os.path.exists("logo.png"):
-        logo_para.add_run().add_picture("logo.png", width=Cm(3.5))
+    logo_bytes = load_image_asset(LOGO_PATH, width=LOGO_WIDTH)
+    if logo_bytes:
+        logo_para.add_run().add_picture(io.BytesIO(logo_bytes), width=LOGO_WIDTH)
 
     # --- 3. DOUBLE SOLID LINE DIVIDER ---
     line_para = header.add_paragraph()
@@ -90,6 +160,122 @@ def generate_word_quotation(q):
     pBdr.append(bottom)
     pPr.append(pBdr)
 
+    # --- 10. FOOTER CODE ---
+    def setup_styled_footer(footer_obj):
+        footer_obj.is_linked_to_previous = False
+        f_para = footer_obj.paragraphs[0]
+        f_para.clear()
+        f_table = footer_obj.add_table(1, 2, width=CONTENT_WIDTH)
+        f_table.allow_autofit = False
+        f_table.columns[0].width = Cm(13.0); f_table.columns[1].width = Cm(5.46)
+        
+        l_run = f_table.rows[0].cells[0].paragraphs[0].add_run("www.jawsafrica.com")
+        l_run.font.name = 'Calibri'; l_run.font.size = Pt(10)
+        
+        r_para = f_table.rows[0].cells[1].paragraphs[0]
+        r_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT; r_para.add_run("Page ")
+        
+        f_p = r_para._p
+        for tag in ["begin", "PAGE", "end"]:
+            r = OxmlElement('w:r')
+            if tag in ["begin", "end"]:
+                fld = OxmlElement('w:fldChar'); fld.set(qn('w:fldCharType'), tag); r.append(fld)
+            else:
+                txt = OxmlElement('w:instrText'); txt.text = tag; r.append(txt)
+            f_p.append(r)
+        
+        for run in r_para.runs: run.font.name = 'Calibri'; run.font.size = Pt(10)
+
+    setup_styled_footer(section.first_page_footer)
+    setup_styled_footer(section.footer)
+
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+def base_template_bytes():
+    global _base_template
+    if _base_template is None:
+        with _base_template_lock:
+            if _base_template is None:
+                _base_template = _build_base_template()
+    return _base_template
+
+# --- SHARED CONTENT (Word and PDF) ---
+INCLUSIONS = [
+    "Mid-Range accommodation with meal plans as stated in the itinerary",
+    "Transport in a private vehicle & use of customized 4WD Land cruisers with a Driver/Guide",
+    "Game drive time of your choice, support for full day game drive at no extra cost",
+    "Drinking water on safari and transfers",
+    "All National Parks entrance fees and Taxes"
+]
+EXCLUSIONS = [
+    "International/Domestic Flights/Visa and travel insurance",
+    "Alcoholic drinks or soft drinks",
+    "Tips 10 USD per day per person for the driver",
+    "Items of personal nature"
+]
+ITI_COLUMNS = ["Day", "From", "To", "Activities", "Accommodation", "Meal Plan"]
+
+def tariff_summary(q):
+    summary_text = (
+        f"This price is for {q['adults']} adults and {q.get('children_count', 0)} children traveling in {q['vehicles']} private "
+        f"safari vehicle(s) with accommodation in {q['accommodation_summary']} "
+        f"as per the itinerary above."
+    )
+    if q.get('extras_summary'):
+        summary_text += f" This price also includes {q['extras_summary']}."
+    return summary_text
+
+def tariff_rows(q):
+    """Header and value row of the tariff table."""
+    has_kids = q.get('children_count', 0) > 0
+    total_participants = q['adults'] + q.get('children_count', 0)
+    hdrs = ["Item", "Total Cost"]
+    values = [f"{total_participants} PAX Safari", f"{q['total']:,.0f}"]
+    if not has_kids:
+        hdrs.append("Cost per Adult")
+        values.append(f"{q.get('pp', 0):,.0f}")
+    return hdrs, values
+
+# --- BULK TABLE ROWS ---
+# Writing rows through python-docx (add_row, cell.text, run.font) costs a
+# dozen proxy objects per cell; long group safaris have thousands of cells.
+# The same XML is built as one string per table and parsed once instead.
+_CALIBRI_RPR = '<w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri"/></w:rPr>'
+_RUN_BREAKS = re.compile(r'([\t\n\r])')
+
+def _run_xml(text):
+    """The run python-docx builds for `cell.text = text` plus `font.name = 'Calibri'`."""
+    parts = [_CALIBRI_RPR]
+    for piece in _RUN_BREAKS.split(text):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\n', '\r'):
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if piece.strip() != piece else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    return f'<w:r>{"".join(parts)}</w:r>'
+
+def append_table_rows(table, rows):
+    """Appends rows of cell strings to a python-docx table in one XML parse."""
+    widths = [gc.w.twips for gc in table._tbl.tblGrid.gridCol_lst]
+    xml = "".join(
+        "<w:tr>" + "".join(
+            f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{w}"/></w:tcPr><w:p>{_run_xml(text)}</w:p></w:tc>'
+            for w, text in zip(widths, values)
+        ) + "</w:tr>"
+        for values in rows
+    )
+    if xml:
+        table._tbl.extend(parse_xml(f"<w:tbl {nsdecls('w')}>{xml}</w:tbl>"))
+
+@timed()
+def generate_word_quotation(q):
+    doc = Document(io.BytesIO(base_template_bytes()))
+    content_width = CONTENT_WIDTH
+
     # --- 4. BODY CONTENT (UNDERLINED TITLE WITH GAP) ---
     title = doc.add_paragraph()
     title.paragraph_format.space_after = Pt(10) 
@@ -150,8 +336,7 @@ def generate_word_quotation(q):
     tbl_ind.set(qn('w:type'), 'dxa')
     tbl_pr.append(tbl_ind)
 
-    hdrs = ["Day", "From", "To", "Activities", "Accommodation", "Meal Plan"]
-    for i, h in enumerate(hdrs):
+    for i, h in enumerate(ITI_COLUMNS):
         cell = iti_table.rows[0].cells[i]
         cell.text = h
         set_cell_grey(cell) 
@@ -161,21 +346,8 @@ def generate_word_quotation(q):
             run.bold = True
             run.font.name = 'Calibri'
 
-    # Populating ITINERARY data with explicit mapping
-    for row_data in q['iti']:
-        row_cells = iti_table.add_row().cells
-        row_cells[0].text = str(row_data.get("Day", ""))
-        row_cells[1].text = str(row_data.get("From", ""))
-        row_cells[2].text = str(row_data.get("To", ""))
-        row_cells[3].text = str(row_data.get("Activities", ""))
-        row_cells[4].text = str(row_data.get("Accommodation", ""))
-        row_cells[5].text = str(row_data.get("Meal Plan", ""))
-        
-        # Ensure Calibri for all table content
-        for cell in row_cells:
-            for p in cell.paragraphs:
-                for r in p.runs:
-                    r.font.name = 'Calibri'
+    # Populating ITINERARY data with explicit mapping (Calibri runs, see append_table_rows)
+    append_table_rows(iti_table, [[str(row_data.get(col, "")) for col in ITI_COLUMNS] for row_data in q['iti']])
 
     # --- NEW: DETAILED PRICE BREAKDOWN TABLE ---
     if q.get('price_table') is not None:
@@ -200,20 +372,15 @@ def generate_word_quotation(q):
                 p.runs[0].bold = True
                 p.runs[0].font.name = 'Calibri'
 
-        for p_row in q['price_table']:
-            cells = p_table.add_row().cells
-            cells[0].text = str(p_row.get("Category", ""))
-            cells[1].text = f"{p_row.get('Cost', 0):,.2f}"
-            for c in cells:
-                for p in c.paragraphs:
-                    for r in p.runs: r.font.name = 'Calibri'
+        append_table_rows(p_table, [[str(p_row.get("Category", "")), f"{p_row.get('Cost', 0):,.2f}"]
+                                    for p_row in q['price_table']])
 
     # --- 6. TARIFF TABLE ---
     add_styled_heading('TARIFF IN USD')
     
     # PAX Logic updated for Total price only when children are present
-    has_kids = q.get('children_count', 0) > 0
-    t_table = doc.add_table(rows=2, cols=2 if has_kids else 3)
+    t_hdrs, t_values = tariff_rows(q)
+    t_table = doc.add_table(rows=1, cols=len(t_hdrs))
     t_table.style = 'Table Grid'
     t_table.alignment = WD_ALIGN_PARAGRAPH.LEFT
     t_table.width = content_width
@@ -226,9 +393,6 @@ def generate_word_quotation(q):
     t_tbl_pr.append(t_tbl_ind)
 
     # Header Row for Tariff
-    t_hdrs = ["Item", "Total Cost"]
-    if not has_kids: t_hdrs.append("Cost per Adult")
-    
     for i, h in enumerate(t_hdrs):
         cell = t_table.rows[0].cells[i]
         cell.text = h
@@ -238,30 +402,10 @@ def generate_word_quotation(q):
             p.runs[0].bold = True
             p.runs[0].font.name = 'Calibri'
 
-    tr = t_table.rows[1].cells
-    total_participants = q['adults'] + q.get('children_count', 0)
-    tr[0].text = f"{total_participants} PAX Safari"
-    tr[1].text = f"{q['total']:,.0f}"
-    
-    # Handle cost per adult key only if it exists (Fix for KeyError: 'pp')
-    if not has_kids and len(tr) > 2:
-        tr[2].text = f"{q.get('pp', 0):,.0f}"
-    
-    for cell in tr:
-        if cell.paragraphs[0].runs:
-            cell.paragraphs[0].runs[0].font.name = 'Calibri'
+    append_table_rows(t_table, [t_values])
 
     # --- TARIFF SUMMARY SENTENCE ---
-    summary_text = (
-        f"This price is for {q['adults']} adults and {q.get('children_count', 0)} children traveling in {q['vehicles']} private "
-        f"safari vehicle(s) with accommodation in {q['accommodation_summary']} "
-        f"as per the itinerary above."
-    )
-    
-    if q.get('extras_summary'):
-        summary_text += f" This price also includes {q['extras_summary']}."
-    
-    p_summary = doc.add_paragraph(summary_text)
+    p_summary = doc.add_paragraph(tariff_summary(q))
     p_summary.paragraph_format.space_after = Pt(8)
     p_summary.paragraph_format.left_indent = Cm(0.12)
     
@@ -296,56 +440,495 @@ def generate_word_quotation(q):
 
     # --- 8. UPDATED INCLUSIONS ---
     add_styled_heading('INCLUSIONS')
-    inclusions = [
-        "Mid-Range accommodation with meal plans as stated in the itinerary",
-        "Transport in a private vehicle & use of customized 4WD Land cruisers with a Driver/Guide",
-        "Game drive time of your choice, support for full day game drive at no extra cost",
-        "Drinking water on safari and transfers",
-        "All National Parks entrance fees and Taxes"
-    ]
-    for item in inclusions: doc.add_paragraph(item, style='List Bullet')
+    for item in INCLUSIONS: doc.add_paragraph(item, style='List Bullet')
     
     # --- 9. UPDATED EXCLUSIONS ---
     add_styled_heading('EXCLUSIONS')
-    exclusions = [
-        "International/Domestic Flights/Visa and travel insurance",
-        "Alcoholic drinks or soft drinks",
-        "Tips 10 USD per day per person for the driver",
-        "Items of personal nature"
-    ]
-    for item in exclusions: doc.add_paragraph(item, style='List Bullet')
+    for item in EXCLUSIONS: doc.add_paragraph(item, style='List Bullet')
 
     doc.add_paragraph("\n\nThank you for Choosing Jaws Africa").alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-    # --- 10. FOOTER CODE ---
-    def setup_styled_footer(footer_obj):
-        footer_obj.is_linked_to_previous = False
-        f_para = footer_obj.paragraphs[0]
-        f_para.clear()
-        f_table = footer_obj.add_table(1, 2, width=content_width)
-        f_table.allow_autofit = False
-        f_table.columns[0].width = Cm(13.0); f_table.columns[1].width = Cm(5.46)
-        
-        l_run = f_table.rows[0].cells[0].paragraphs[0].add_run("www.jawsafrica.com")
-        l_run.font.name = 'Calibri'; l_run.font.size = Pt(10)
-        
-        r_para = f_table.rows[0].cells[1].paragraphs[0]
-        r_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT; r_para.add_run("Page ")
-        
-        f_p = r_para._p
-        for tag in ["begin", "PAGE", "end"]:
-            r = OxmlElement('w:r')
-            if tag in ["begin", "end"]:
-                fld = OxmlElement('w:fldChar'); fld.set(qn('w:fldCharType'), tag); r.append(fld)
-            else:
-                txt = OxmlElement('w:instrText'); txt.text = tag; r.append(txt)
-            f_p.append(r)
-        
-        for run in r_para.runs: run.font.name = 'Calibri'; run.font.size = Pt(10)
-
-    setup_styled_footer(section.first_page_footer)
-    setup_styled_footer(section.footer)
-
     buf = io.BytesIO()
     doc.save(buf)
-    return buf.getvalue()
\ No newline at end of file
+    return buf.getvalue()
+
+
+# --- PDF QUOTATION (fpdf) ---
+# Same content and order as generate_word_quotation, drawn with fpdf's core
+# Helvetica (the nearest built-in font to Calibri). Sizes are in mm.
+PDF_MARGIN = 12.7
+PDF_TOP = 10
+PDF_CONTENT_WIDTH = 184.6
+PDF_TABLE_INDENT = 1.76  # the Word tables' 100 dxa left indent
+PDF_ITI_WIDTHS = [17, 28, 28, 45, 42, 22.84]
+HEADING_FILL = (255, 192, 0)   # FFC000, as the Word section headings
+HEADER_FILL = (217, 217, 217)  # D9D9D9, as the Word table headers
+PT = 25.4 / 72
+
+def _pdf_text(value):
+    """Core fonts are cp1252: map what it has and print '?' for the rest."""
+    return str(value).encode("cp1252", "replace").decode("latin-1")
+
+_pdf_logo_paths = {}
+
+def _pdf_logo_path():
+    # fpdf 1.7 reads images from a path and rejects PNG alpha, so the scaled
+    # logo is flattened onto white once and written to the temp dir
+    data = load_image_asset(LOGO_PATH, width=LOGO_WIDTH)
+    if data is None:
+        return None
+    key = hashlib.sha1(data).hexdigest()[:16]
+    path = _pdf_logo_paths.get(key)
+    if path is None or not os.path.exists(path):
+        with _image_cache_lock:
+            path = os.path.join(tempfile.gettempdir(), f"jaws_logo_{key}.png")
+            if not os.path.exists(path):
+                img = Image.open(io.BytesIO(data)).convert("RGBA")
+                flat = Image.new("RGB", img.size, (255, 255, 255))
+                flat.paste(img, mask=img.split()[3])
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                flat.save(tmp_path, format="PNG")
+                os.replace(tmp_path, path)
+            _pdf_logo_paths[key] = path
+    return path
+
+
+class QuotationPDF(FPDF):
+    """A4 page with the company header on page one and the footer on every page.
+
+    Every piece of body text is also appended to `outline`, in drawing
+    order, for pdf_parity_problems.
+    """
+
+    def __init__(self):
+        super().__init__(orientation="P", unit="mm", format="A4")
+        self.set_margins(PDF_MARGIN, PDF_TOP, PDF_MARGIN)
+        self.set_auto_page_break(True, margin=18)
+        self.outline = []
+
+    def header(self):
+        if self.page_no() != 1:
+            return
+        text_width = 145
+        self.set_xy(PDF_MARGIN, PDF_TOP)
+        name = "JIGSAW AFRICA WILDLIFE SAFARIS LTD (JAWS AFRICA)"
+        # Helvetica is wider than Calibri: shrink the company name until it fits one line
+        size = 17
+        self.set_font("Helvetica", "B", size)
+        while size > 10 and self.get_string_width(name) > text_width:
+            size -= 0.5
+            self.set_font("Helvetica", "B", size)
+        self.cell(text_width, size * PT * 1.3, name, ln=2)
+        self.set_font("Helvetica", "B", 11)
+        self.cell(text_width, 5, "REGISTRATION PIN: P052221766X", ln=2)
+        self.set_font("Helvetica", "", 11)
+        for line in ("Mercantile House, 2nd floor, Room 230, Koinange street, Nairobi, Kenya",
+                     "Emails: info@jawsafrica.com | Web: www.jawsafrica.com",
+                     "Mobile: +254 719899245 (KE) | +965 94067244 (KW) | +91 9496656977 (IN)"):
+            self.cell(text_width, 5, line, ln=2)
+        bottom = self.get_y()
+        logo = _pdf_logo_path()
+        if logo:
+            logo_w = LOGO_WIDTH.mm
+            with Image.open(logo) as img:
+                logo_h = logo_w * img.height / img.width
+            self.image(logo, x=self.w - PDF_MARGIN - logo_w, y=PDF_TOP + max(0, (bottom - PDF_TOP - logo_h) / 2), w=logo_w)
+            bottom = max(bottom, PDF_TOP + logo_h)
+        # Double solid divider
+        y = bottom + 1.5
+        self.set_line_width(0.3)
+        self.line(PDF_MARGIN, y, self.w - PDF_MARGIN, y)
+        self.line(PDF_MARGIN, y + 0.9, self.w - PDF_MARGIN, y + 0.9)
+        self.set_line_width(0.2)
+        self.set_xy(PDF_MARGIN, y + 4)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Helvetica", "", 10)
+        self.cell(130, 5, "www.jawsafrica.com")
+        self.cell(0, 5, f"Page {self.page_no()}", align="R")
+
+    # --- body helpers ---
+    def text_line(self, text, style="", size=11, height=5, align="", fill=False):
+        self.outline.append(str(text))
+        self.set_font("Helvetica", style, size)
+        self.cell(0, height, _pdf_text(text), ln=1, align=align, fill=fill)
+
+    def paragraph(self, text, style="", size=10.5, indent=0, align="J", line_spacing=1.0):
+        self.outline.append(str(text))
+        self.set_font("Helvetica", style, size)
+        self.set_x(self.l_margin + indent)
+        self.multi_cell(self.w - self.r_margin - self.get_x(), size * PT * 1.2 * line_spacing, _pdf_text(text), align=align)
+
+    def heading(self, text):
+        # Keep a heading on the same page as at least the first lines under it
+        if self.get_y() + 25 > self.page_break_trigger:
+            self.add_page()
+        self.ln(12 * PT)
+        self.set_fill_color(*HEADING_FILL)
+        self.set_text_color(0, 0, 0)
+        self.text_line(f" {text}", style="B", size=12, height=6.5, fill=True)
+        self.ln(6 * PT)
+
+    def bullet(self, text):
+        self.outline.append(str(text))
+        self.set_font("Helvetica", "", 11)
+        self.set_x(self.l_margin + 6.35)
+        self.cell(6.35, 5, "\x95")
+        self.multi_cell(self.w - self.r_margin - self.get_x(), 5, _pdf_text(text), align="L")
+
+    def table(self, widths, header, rows, size=11):
+        """Bordered table with a grey header row; rows wrap and never split across pages."""
+        pad, line_h = 1.0, size * PT * 1.2
+
+        def draw_row(values, fill):
+            cells = [_pdf_text(v) for v in values]
+            self.set_font("Helvetica", "B" if fill else "", size)
+            # multi_cell/cell keep fpdf's own cMargin on the left and right of each line
+            lines = [self.multi_cell(w, line_h, text, split_only=True) or [""]
+                     for w, text in zip(widths, cells)]
+            height = max(len(l) for l in lines) * line_h + 2 * pad
+            if not fill and self.get_y() + height > self.page_break_trigger:
+                self.add_page()
+                draw_row(header, True)
+                self.set_font("Helvetica", "", size)
+            x, y = self.l_margin + PDF_TABLE_INDENT, self.get_y()
+            self.set_fill_color(*HEADER_FILL)
+            for w, cell_lines in zip(widths, lines):
+                self.rect(x, y, w, height, "DF" if fill else "D")
+                for i, line in enumerate(cell_lines):
+                    self.set_xy(x, y + pad + i * line_h)
+                    self.cell(w, line_h, line)
+                x += w
+            self.set_xy(self.l_margin, y + height)
+
+        self.outline.extend(str(v) for v in header)
+        draw_row(header, True)
+        for values in rows:
+            self.outline.extend(str(v) for v in values)
+            draw_row(values, False)
+
+
+def _render_pdf(q):
+    pdf = QuotationPDF()
+    pdf.add_page()
+
+    pdf.text_line(f"Quotation for {q['client']}| {q['country']}", style="BU", size=14, height=7)
+    pdf.ln(10 * PT)
+    for line in (f"TOUR CODE:   {q['code']}",
+                 f"{q['country'].upper()} SAFARI PRIVATE PACKAGE :  {q['pkg']}",
+                 f"DATE:   FROM {q['start']} TO {q['end']}"):
+        pdf.text_line(line)
+
+    pdf.heading('ITINERARY PLAN')
+    pdf.table(PDF_ITI_WIDTHS, ITI_COLUMNS,
+              [[str(row.get(col, "")) for col in ITI_COLUMNS] for row in q['iti']], size=10)
+
+    if q.get('price_table') is not None:
+        pdf.heading('DETAILED PRICE BREAKDOWN')
+        half = (PDF_CONTENT_WIDTH - PDF_TABLE_INDENT) / 2
+        pdf.table([half, half], ["Traveler Category", "Total Cost (USD)"],
+                  [[str(r.get("Category", "")), f"{r.get('Cost', 0):,.2f}"] for r in q['price_table']])
+
+    pdf.heading('TARIFF IN USD')
+    t_hdrs, t_values = tariff_rows(q)
+    col = (PDF_CONTENT_WIDTH - PDF_TABLE_INDENT) / len(t_hdrs)
+    pdf.table([col] * len(t_hdrs), t_hdrs, [t_values])
+    pdf.ln(2)
+    pdf.paragraph(tariff_summary(q), style="I", indent=1.2, align="L")
+    pdf.ln(8 * PT)
+
+    if q.get('detailed_iti'):
+        pdf.heading('DETAILED ITINERARY')
+        for day_info in q['detailed_iti']:
+            pdf.ln(10 * PT)
+            pdf.text_line(f"{day_info['day']} :-", style="BU", height=5.5)
+            pdf.ln(2 * PT)
+            pdf.paragraph(day_info['details'], indent=1.2, line_spacing=1.15)
+
+    pdf.heading('INCLUSIONS')
+    for item in INCLUSIONS: pdf.bullet(item)
+    pdf.heading('EXCLUSIONS')
+    for item in EXCLUSIONS: pdf.bullet(item)
+
+    pdf.ln(12)
+    pdf.text_line("Thank you for Choosing Jaws Africa", align="C")
+    return pdf
+
+@timed()
+def generate_pdf_quotation(q):
+    """The quotation as PDF bytes, laid out like generate_word_quotation."""
+    out = _render_pdf(q).output(dest="S")
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
+
+
+def _docx_outline(data):
+    """Body text of a rendered .docx in document order, one entry per paragraph or table cell."""
+    doc = Document(io.BytesIO(data))
+    texts = []
+    for el in doc.element.body.iterchildren():
+        if el.tag == qn('w:p'):
+            texts.append(Paragraph(el, doc).text)
+        elif el.tag == qn('w:tbl'):
+            for row in Table(el, doc).rows:
+                texts.extend(cell.text for cell in row.cells)
+    return texts
+
+def pdf_parity_problems(q):
+    """Differences between the Word and PDF renderings of `q`, as diff lines.
+
+    Compares the body text of both in order (headings, summary lines, every
+    table cell, paragraphs and bullets). An empty list means the PDF carries
+    exactly what the Word file does.
+    """
+    def normalise(texts):
+        return [t for t in (" ".join(_pdf_text(x).split()) for x in texts) if t]
+    word = normalise(_docx_outline(generate_word_quotation(q)))
+    pdf = normalise(_render_pdf(q).outline)
+    return list(difflib.unified_diff(word, pdf, "word", "pdf", lineterm="", n=0))
+
+
+# --- RENDERED DOCUMENT CACHE ---
+# Documents are content-addressed: the key hashes the normalised quote
+# config, the format and renderer_version(), so identical quotes share one
+# entry and changing this file, the logo or python-docx/fpdf starts afresh.
+# Tiers, checked in order and back-filled on a hit:
+#   1. process memory, LRU, up to RENDER_CACHE_MAX_MB
+#   2. local disk under RENDER_CACHE_DIR, LRU by mtime, up to RENDER_DISK_CACHE_MAX_MB
+#   3. with RENDER_CACHE_DB=1, a compressed bytea table in Postgres (database.py)
+RENDER_CACHE_MAX_BYTES = int(float(os.getenv("RENDER_CACHE_MAX_MB", "64")) * 1024 * 1024)
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", ".render_cache")
+RENDER_DISK_CACHE_MAX_BYTES = int(float(os.getenv("RENDER_DISK_CACHE_MAX_MB", "512")) * 1024 * 1024)
+RENDER_CACHE_DB = os.getenv("RENDER_CACHE_DB", "0") == "1"
+
+_render_cache = OrderedDict()
+_render_cache_bytes = 0
+_render_cache_lock = threading.Lock()
+_renderer_version = None
+_render_cache_hits = {"memory": 0, "disk": 0, "db": 0, "rendered": 0}
+
+def config_hash(q):
+    """Stable hash of a quote config (key order does not matter)."""
+    payload = json.dumps(q, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def renderer_version():
+    """Hash of everything besides the config that shapes the output."""
+    global _renderer_version
+    if _renderer_version is None:
+        import docx
+        import fpdf
+        digest = hashlib.sha256()
+        with open(__file__, "rb") as fh:
+            digest.update(fh.read())
+        if os.path.exists(LOGO_PATH):
+            with open(LOGO_PATH, "rb") as fh:
+                digest.update(fh.read())
+        digest.update(f"{docx.__version__}|{fpdf.FPDF_VERSION}|{LOGO_DPI}".encode())
+        _renderer_version = digest.hexdigest()[:16]
+    return _renderer_version
+
+def render_key(q, fmt):
+    return hashlib.sha256(f"{fmt}:{renderer_version()}:{config_hash(q)}".encode()).hexdigest()
+
+def _memory_put(key, data):
+    global _render_cache_bytes
+    with _render_cache_lock:
+        if key not in _render_cache and len(data) <= RENDER_CACHE_MAX_BYTES:
+            _render_cache[key] = data
+            _render_cache_bytes += len(data)
+            while _render_cache_bytes > RENDER_CACHE_MAX_BYTES:
+                _, evicted = _render_cache.popitem(last=False)
+                _render_cache_bytes -= len(evicted)
+
+def _disk_path(key, fmt):
+    return os.path.join(RENDER_CACHE_DIR, f"{key}.{fmt}")
+
+def _disk_get(key, fmt):
+    path = _disk_path(key, fmt)
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        os.utime(path)  # mtime is the LRU clock
+    except OSError:
+        return None
+    return data
+
+def _disk_put(key, fmt, data):
+    try:
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_disk_path(key, fmt)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, _disk_path(key, fmt))
+        entries = []
+        for entry in os.scandir(RENDER_CACHE_DIR):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= RENDER_DISK_CACHE_MAX_BYTES:
+                break
+            os.remove(path)
+            total -= size
+    except OSError:
+        # Read-only or full disk: the memory and DB tiers still work
+        pass
+
+def _count_render(tier):
+    with _render_cache_lock:
+        _render_cache_hits[tier] += 1
+
+def render_cache_stats():
+    """Snapshot of the render cache for the master admin's timing panel."""
+    with _render_cache_lock:
+        stats = dict(_render_cache_hits)
+        stats["entries"] = len(_render_cache)
+        stats["memory_mb"] = round(_render_cache_bytes / 1024 / 1024, 1)
+    return stats
+
+def cached_render(q, fmt="docx"):
+    """The quotation as `fmt` ("docx" or "pdf"), from the fastest cache tier that has it."""
+    key = render_key(q, fmt)
+    with _render_cache_lock:
+        data = _render_cache.get(key)
+        if data is not None:
+            _render_cache.move_to_end(key)
+            _render_cache_hits["memory"] += 1
+            return data
+    data = _disk_get(key, fmt)
+    if data is not None:
+        _count_render("disk")
+        _memory_put(key, data)
+        return data
+    if RENDER_CACHE_DB:
+        from database import get_cached_render
+        try:
+            data = get_cached_render(key)
+        except Exception:  # the DB tier is best effort
+            data = None
+        if data is not None:
+            _count_render("db")
+            _memory_put(key, data)
+            _disk_put(key, fmt, data)
+            return data
+    data = generate_pdf_quotation(q) if fmt == "pdf" else generate_word_quotation(q)
+    _count_render("rendered")
+    _memory_put(key, data)
+    _disk_put(key, fmt, data)
+    if RENDER_CACHE_DB:
+        from database import put_cached_render
+        try:
+            put_cached_render(key, fmt, data)
+        except Exception:
+            pass
+    return data
+
+def cached_word_quotation(q):
+    """generate_word_quotation served from the render cache."""
+    return cached_render(q, "docx")
+
+def cached_pdf_quotation(q):
+    """generate_pdf_quotation served from the render cache."""
+    return cached_render(q, "pdf")
+
+
+# --- BULK EXPORT ---
+# Built ZIPs wait here until downloaded; files older than EXPORT_MAX_AGE_MIN are
+# swept on the next build (abandoned sessions) and this process's on exit
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "jaws_exports"))
+EXPORT_MAX_AGE = float(os.getenv("EXPORT_MAX_AGE_MIN", "60")) * 60
+
+_export_paths = set()
+
+def _warm_worker():
+    # Build the base template (and scaled logo) once per worker, not once per quote
+    base_template_bytes()
+
+def export_quotes_zip(quotes, out, total=None, workers=None, progress=None):
+    """Renders (file name, q) pairs in a process pool into a ZIP written to `out`.
+
+    Each document is written to the archive as soon as it is rendered and
+    then dropped, and at most two renders per worker are in flight, so
+    memory does not grow with the number of quotes. `progress(done, total)`
+    is called after every document. A quote that fails to render is left
+    out and the export carries on. Returns (documents written, [(file name,
+    error)] for the failures).
+    """
+    workers = workers or os.cpu_count() or 1
+    # spawn, not fork: the Streamlit server process has live threads and DB sockets
+    ctx = multiprocessing.get_context("spawn")
+    done, failed = 0, []
+    quotes = iter(quotes)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_warm_worker) as pool, \
+            zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                item = next(quotes, None)
+                if item is None:
+                    exhausted = True
+                else:
+                    name, q = item
+                    # Workers share the disk (and DB) cache tiers, so re-exports skip rendering
+                    pending[pool.submit(cached_word_quotation, q)] = name
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as exc:
+                    failed.append((name, f"{type(exc).__name__}: {exc}"))
+                else:
+                    # .docx is already deflated; store it as-is
+                    zf.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+                done += 1
+                if progress:
+                    progress(done, total)
+    return done - len(failed), failed
+
+def _sweep_exports(max_age):
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith(".zip") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def build_export_zip(quotes, total=None, progress=None):
+    """export_quotes_zip into a new file under EXPORT_DIR.
+
+    Returns (path, failures); path is None when no quote could be rendered.
+    The file is removed if the build fails; the caller removes it once served.
+    """
+    _sweep_exports(EXPORT_MAX_AGE)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".zip", dir=EXPORT_DIR)
+    _export_paths.add(path)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            written, failed = export_quotes_zip(quotes, out, total=total, progress=progress)
+    finally:
+        if not written:
+            os.remove(path)
+            _export_paths.discard(path)
+    return (path if written else None), failed
+
+@atexit.register
+def _remove_exports():
+    # ZIPs built but never downloaded by this server process
+    for path in list(_export_paths):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
\ No newline at end of file
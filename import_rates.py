@@ -0,0 +1,118 @@
+"""Imports rate workbooks into the versioned rate tables in Postgres.
+
+    python import_rates.py Kenya.xlsx [Tanzania.xlsx ...] [--country NAME] [--stage] [--verify]
+    python import_rates.py --list [--country NAME]
+    python import_rates.py --activate Kenya 3
+
+Each workbook becomes the next rate version of its country (named after
+the file unless --country is given) and is made current in the same
+transaction as its rows, so an app running with RATES_SOURCE=db moves to
+the new rates within RATES_DB_RECHECK seconds, without a redeploy.
+--stage imports without publishing; --activate publishes a staged
+version or rolls back to an older one.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import database
+from rates import RATE_SHEETS, ACC_RATE_COLUMNS, read_rate_sheets, compile_tables, stay_days
+
+
+def verify_version(country, version, sheets):
+    """Problems found comparing a stored version with the sheets it was imported from.
+
+    Checks that the tables read back as the same frames, and that the SQL
+    night lookup (database.stay_rates) prices every room on every night of
+    its seasons like the compiled in-memory index does.
+    """
+    problems = []
+    stored = database.load_rate_version(database.rate_version_id(country, version))
+    for key in RATE_SHEETS:
+        try:
+            pd.testing.assert_frame_equal(stored[key], sheets[key], check_dtype=True)
+        except AssertionError as err:
+            problems.append(f"{key} sheet does not read back unchanged: {err}")
+    tables = compile_tables(stored)
+    acc, index = tables["acc"], tables["acc_index"]
+    start, end = acc['Date From'].min(), acc['Date To'].max()
+    nights = (end - start).days + 1
+    keys = list(index.keys())
+    rows = database.stay_rates(country, [(*key, start.date(), nights) for key in keys], version)
+    sql = {}
+    for stay, night, single, double, triple, _ in rows:
+        sql.setdefault(stay, []).append((single, double, triple))
+    for n, key in enumerate(keys):
+        positions, _ = index.lookup(key, stay_days(start, nights))
+        expected = np.full((nights, 3), np.nan)
+        covered = positions >= 0
+        expected[covered] = acc[ACC_RATE_COLUMNS].to_numpy(dtype=float)[positions[covered]]
+        got = np.array(sql.get(n, []), dtype=float).reshape(-1, 3)
+        if got.shape != expected.shape or not np.allclose(got, expected, equal_nan=True):
+            problems.append(f"SQL and in-memory rates differ for {' / '.join(map(str, key))}")
+    return problems
+
+
+def import_workbook(path, country=None, activate=True, verify=False):
+    """Imports one workbook; returns (country, version, problems)."""
+    country = country or os.path.splitext(os.path.basename(path))[0]
+    sheets = read_rate_sheets(path)
+    version = database.publish_rate_version(country, sheets, source=os.path.basename(path), activate=activate)
+    problems = verify_version(country, version, read_rate_sheets(path)) if verify else []
+    return country, version, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import rate workbooks into Postgres as new rate versions.")
+    parser.add_argument("workbooks", nargs="*", help="{Country}.xlsx files to import")
+    parser.add_argument("--country", help="country name (default: the workbook's file name)")
+    parser.add_argument("--stage", action="store_true", help="import without making the new version current")
+    parser.add_argument("--verify", action="store_true", help="check the stored version against the workbook")
+    parser.add_argument("--list", action="store_true", help="list imported versions")
+    parser.add_argument("--activate", nargs=2, metavar=("COUNTRY", "VERSION"), help="make a version current")
+    args = parser.parse_args(argv)
+    if not (args.workbooks or args.list or args.activate):
+        parser.error("give workbooks to import, --list or --activate")
+    if args.country and len(args.workbooks) > 1:
+        parser.error("--country needs a single workbook")
+
+    database.init_db()
+    failed = 0
+    for path in args.workbooks:
+        try:
+            country, version, problems = import_workbook(path, args.country, not args.stage, args.verify)
+        except (OSError, ValueError) as err:
+            print(f"{path}: {err}", file=sys.stderr)
+            failed += 1
+            continue
+        state = "staged" if args.stage else "published"
+        print(f"{path}: {country} version {version} {state}")
+        overlaps = database.rate_season_overlaps(country, version)
+        if overlaps:
+            print(f"  {len(overlaps)} overlapping season(s); the first row in sheet order is used:")
+            for loc, prop, room, first, last in overlaps:
+                print(f"    {loc} / {prop} / {room}: {first} to {last}")
+        for problem in problems:
+            print(f"  {problem}", file=sys.stderr)
+        failed += bool(problems)
+    if args.activate:
+        country, version = args.activate
+        try:
+            database.activate_rate_version(country, int(version))
+            print(f"{country} version {version} is now current")
+        except ValueError as err:
+            print(err, file=sys.stderr)
+            failed += 1
+    if args.list:
+        for country, version, source, current, imported, published in database.list_rate_versions(args.country):
+            flag = "*" if current else " "
+            print(f"{flag} {country} v{version}  {source or ''}  imported {imported:%Y-%m-%d %H:%M}"
+                  + (f"  published {published:%Y-%m-%d %H:%M}" if published else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,548 @@
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+from timing import timed
+
+# Arrival/departure airport per country, used for the first and last itinerary day
+AIRPORT_MAP = {
+    "Kenya": "Nairobi",
+    "Tanzania": "Kilimanjaro",
+    "Uganda": "Entebbe",
+    "Rwanda": "Kigali"
+}
+
+# Room types in the order they appear in the Room Quantities row
+ROOM_TYPES = ["Single", "Double", "Triple"]
+ROOM_CAPACITY = {"Single": 1, "Double": 2, "Triple": 3}
+
+
+def rate_column(room_type):
+    return f"{room_type} (Cost Per Person/Per Night)"
+
+
+class PricingError(ValueError):
+    """Raised when a trip cannot be priced; `problems` lists every reason found."""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("; ".join(self.problems))
+
+
+@dataclass(slots=True)
+class Traveler:
+    """One person on the trip. `form_factors` maps property -> child rate factor."""
+    id: int
+    category: str
+    age: int | None
+    name: str
+    form_factors: dict = field(default_factory=dict)
+
+    @property
+    def label(self):
+        # Text used on the room checkboxes, extras pickers and price table
+        return self.name if self.category == "Adult" else f"{self.name} (Age {self.age})"
+
+    def factor_at(self, prop):
+        # Adults pay the full rate; so do children the property has no policy row for
+        if self.category == "Adult":
+            return 1.0
+        return self.form_factors.get(prop, 1.0)
+
+
+class TravelerRegistry:
+    """The trip's travelers, addressable by integer id or by display label."""
+    __slots__ = ("travelers", "_by_label")
+
+    def __init__(self, travelers):
+        self.travelers = list(travelers)
+        self._by_label = {t.label: t for t in self.travelers}
+
+    @classmethod
+    def build(cls, num_adults, child_ages, child_index):
+        """Adults 1..n then Children 1..m; `child_index` is rates' {age: {property: factor}}."""
+        travelers = [Traveler(i, "Adult", None, f"Adult {i+1}") for i in range(num_adults)]
+        for n, age in enumerate(child_ages):
+            age = int(age)
+            travelers.append(Traveler(len(travelers), "Child", age, f"Child {n+1}", dict(child_index.get(age, {}))))
+        return cls(travelers)
+
+    def __iter__(self):
+        return iter(self.travelers)
+
+    def __len__(self):
+        return len(self.travelers)
+
+    def __getitem__(self, traveler_id):
+        return self.travelers[traveler_id]
+
+    def labels(self, category=None):
+        return [t.label for t in self.travelers if category is None or t.category == category]
+
+    def ids(self, labels):
+        return [self._by_label[label].id for label in labels]
+
+    def camps_by_id(self, camps):
+        """Camp rows with their room assignments converted from labels to ids."""
+        return [{**camp, "assignments": {r_type: [self.ids(room) for room in rooms]
+                                         for r_type, rooms in camp["assignments"].items()}}
+                for camp in camps]
+
+    def extras_by_id(self, extras):
+        """Additional Charges rows with their adult/child selections converted to ids."""
+        return [{**item, "a_sel": self.ids(item["a_sel"]), "c_sel": self.ids(item["c_sel"]),
+                 "dyn_prices": {self._by_label[label].id: price for label, price in item.get("dyn_prices", {}).items()
+                                if label in self._by_label}}
+                for item in extras]
+
+
+def _first_match(cand, keys, order_col):
+    # Several sheet rows can match; keep the first in sheet order like `.iloc[0]` did
+    return cand.sort_values(order_col, kind="stable").drop_duplicates(keys)
+
+
+def _nights_frame(tables, trip, problems, overlaps):
+    """One row per trip night with the camp and its resolved rate row."""
+    frames = []
+    stay_date = pd.Timestamp(trip["start"])
+    for camp_idx, camp in enumerate(trip["camps"]):
+        stay = tables["acc_index"].resolve((camp["loc"], camp["prop"], camp["type"]), stay_date, camp["nights"])
+        if stay["gaps"]:
+            gap_days = ", ".join(str(d.date()) for d in stay["gaps"])
+            problems.append(f"Rate not found in Excel for {camp['prop']} ({camp['type']}) on {gap_days}")
+        overlaps.extend((camp["prop"], d) for d in stay["overlaps"])
+        rows = stay["rows"]
+        frames.append(pd.DataFrame({
+            "date": rows.index,
+            "camp": camp_idx,
+            "loc": camp["loc"],
+            "prop": camp["prop"],
+            **{r_type: rows[rate_column(r_type)].to_numpy(dtype=float) for r_type in ROOM_TYPES},
+        }))
+        stay_date += pd.Timedelta(days=camp["nights"])
+    nights = pd.concat(frames, ignore_index=True)
+    nights["loc"] = nights["loc"].astype(str)
+    nights["prop"] = nights["prop"].astype(str)
+    return nights
+
+
+def _occupancy_frame(trip):
+    """One row per (camp, traveler) with the room type they sleep in."""
+    rows = []
+    for camp_idx, camp in enumerate(trip["camps"]):
+        for r_type in ROOM_TYPES:
+            for room_idx, room in enumerate(camp["assignments"].get(r_type, [])):
+                for traveler in room:
+                    rows.append((camp_idx, r_type, room_idx, traveler, len(rows)))
+    # `slot` keeps the Single -> Double -> Triple, room-by-room order for reports
+    return pd.DataFrame(rows, columns=["camp", "room_type", "room", "traveler", "slot"])
+
+
+def _child_factors(registry, occupancy):
+    """Form factor per occupied (property, traveler), from each traveler's precomputed factors."""
+    pairs = occupancy[["prop", "traveler"]].drop_duplicates()
+    pairs["factor"] = [registry[t].factor_at(prop) for prop, t in zip(pairs["prop"], pairs["traveler"])]
+    return pairs
+
+
+def _park_fees(tables, nights, travelers, problems):
+    """Park fee per (night, traveler) from the compiled Park Fees index, one lookup per camp."""
+    park_index = tables["park_index"]
+    groups = list(zip(travelers["category"], travelers["age"]))
+    frames = []
+    for camp_idx, camp_nights in nights.groupby("camp", sort=True):
+        loc = camp_nights["loc"].iloc[0]
+        fees = park_index.resolve(loc, camp_nights["date"], groups)
+        missing = np.isnan(fees)
+        for t_pos in np.flatnonzero(missing.any(axis=0)):
+            person = travelers.iloc[t_pos]
+            missing_days = ", ".join(str(d.date()) for d in camp_nights["date"][missing[:, t_pos]])
+            if person["category"] == "Adult":
+                problem = f"Adult park fee not found for {loc} on {missing_days}"
+            else:
+                problem = f"No park fee band for {person['label']} at {loc} on {missing_days}"
+            if problem not in problems:
+                problems.append(problem)
+        frames.append(pd.DataFrame({
+            "night": np.repeat(camp_nights.index.to_numpy(), len(travelers)),
+            "traveler": np.tile(travelers["traveler"].to_numpy(), len(camp_nights)),
+            "park_fee": fees.ravel(),
+        }))
+    if not frames:
+        return pd.DataFrame({"night": [], "traveler": [], "park_fee": []})
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_itinerary(camps, start_airport):
+    """Default Day-by-day itinerary rows for the Word quotation."""
+    iti = []
+    for camp in camps:
+        for _ in range(camp["nights"]):
+            iti.append({
+                "Day": f"Day-{len(iti)+1}", "From": start_airport if not iti else iti[-1]["To"], "To": camp["loc"],
+                "Activities": "Airport Pickup" if len(iti) == 0 else "Game Drive",
+                "Accommodation": camp["prop"], "Meal Plan": "BLD"
+            })
+    iti.append({"Day": f"Day-{len(iti)+1}", "From": iti[-1]["To"], "To": start_airport, "Activities": "Airport Drop", "Accommodation": "End", "Meal Plan": "BL"})
+    return iti
+
+
+def _trip_charges(tables, trip, per):
+    """Adds the vehicle, commission and extras columns to `per`; none of them depend on the dates.
+
+    `per` is indexed by traveler id with `category` and `ff` (form factor)
+    columns. Returns the vehicle, commission and extras summaries.
+    """
+    # --- Vehicle split over paying pax ---
+    days = (pd.Timestamp(trip["end"]) - pd.Timestamp(trip["start"])).days + 1
+    v_rate = float(tables["veh"].iloc[0]['Cost in USD/Per Day'])
+    v_total = v_rate * days * trip["vehicles"]
+    paying = per["ff"] > 0
+    v_per_head = v_total / paying.sum() if paying.any() else 0
+    per["veh"] = np.where(paying, v_per_head, 0.0)
+
+    # --- Commission: full for adults, scaled by form factor for children ---
+    comm_base = float(tables["comm"].iloc[0]['Commission Per Person (USD)'])
+    per["comm"] = comm_base * per["ff"]
+
+    # --- Additional charges ---
+    per["extra"] = 0.0
+    extras = []
+    for item in trip.get("extras", []):
+        if not item.get("name"):
+            continue
+        child_prices = {c_id: (item.get("dyn_prices", {}).get(c_id, item["c_price"]) if item.get("dyn_c") else item["c_price"])
+                        for c_id in item["c_sel"]}
+        charges = pd.Series(item["a_price"], index=item["a_sel"], dtype=float)
+        charges = pd.concat([charges, pd.Series(child_prices, dtype=float)])
+        per["extra"] += charges.groupby(level=0).sum().reindex(per.index, fill_value=0.0)
+        extras.append({
+            "name": item["name"],
+            "adults": len(item["a_sel"]), "adult_total": len(item["a_sel"]) * item["a_price"],
+            "children": len(item["c_sel"]), "child_total": float(sum(child_prices.values())),
+        })
+
+    vehicle = {"rate": v_rate, "days": days, "vehicles": trip["vehicles"], "total": v_total, "per_head": v_per_head}
+    return vehicle, {"base": comm_base, "total": float(per["comm"].sum())}, extras
+
+
+@timed()
+def price_trip(tables, trip):
+    """Prices a trip against compiled rate tables (see rates.load_rate_tables).
+
+    `trip` holds `start`/`end` dates, `vehicles`, `travelers` (a
+    TravelerRegistry), `camps` (dicts with `loc`, `type`, `prop`, `nights`
+    and `assignments` {room type: [[traveler ids]]}) and optional `extras`
+    (the Additional Charges rows, with traveler ids in `a_sel`/`c_sel`).
+
+    Every night x traveler cost is computed with joins over a single grid, so
+    the cost grows with the size of the frames rather than Python loops.
+    Raises PricingError listing every missing rate.
+    """
+    problems, overlaps = [], []
+    registry = trip["travelers"]
+    travelers = pd.DataFrame(
+        [(t.id, t.label, t.name, t.category, t.age) for t in registry],
+        columns=["traveler", "label", "name", "category", "age"])
+    travelers["age"] = pd.to_numeric(travelers["age"])
+
+    nights = _nights_frame(tables, trip, problems, overlaps)
+    occupancy = _occupancy_frame(trip)
+
+    # --- Accommodation: adult room rate x child form factor ---
+    acc = nights.reset_index().rename(columns={"index": "night"}).merge(occupancy, on="camp")
+    acc = acc.merge(travelers[["traveler", "category"]], on="traveler", how="left")
+    type_pos = acc["room_type"].map({r_type: i for i, r_type in enumerate(ROOM_TYPES)}).to_numpy()
+    acc["adult_rate"] = acc[ROOM_TYPES].to_numpy()[np.arange(len(acc)), type_pos]
+    bad_rates = acc[acc["adult_rate"].isna() | (acc["adult_rate"] == 0)]
+    for (r_type, prop), _ in bad_rates.groupby(["room_type", "prop"], sort=False):
+        problems.append(f"Rate missing for {r_type} room at {prop}")
+    acc = acc.merge(_child_factors(registry, occupancy.merge(nights[["camp", "prop"]].drop_duplicates(), on="camp")),
+                    on=["prop", "traveler"], how="left")
+    acc["acc"] = acc["adult_rate"] * acc["factor"]
+
+    park = _park_fees(tables, nights, travelers, problems)
+    if problems:
+        raise PricingError(problems)
+
+    grid = park.merge(acc[["night", "traveler", "room_type", "room", "slot", "adult_rate", "factor", "acc"]],
+                      on=["night", "traveler"], how="left")
+    grid = grid.merge(nights[["date", "camp", "loc", "prop"]], left_on="night", right_index=True)
+    grid = grid.merge(travelers[["traveler", "label", "name", "category"]], on="traveler")
+    grid["acc"] = grid["acc"].fillna(0.0)
+    grid = grid.sort_values(["night"], kind="stable").reset_index(drop=True)
+
+    # --- Per-traveler totals ---
+    per = travelers.set_index("traveler")[["label", "category", "age"]].copy()
+    per["acc"] = grid.groupby("traveler")["acc"].sum().reindex(per.index, fill_value=0.0)
+    per["park"] = grid.groupby("traveler")["park_fee"].sum().reindex(per.index, fill_value=0.0)
+    # Children's form factor is the highest they reach at any camp; 0 means they travel free
+    child_ff = grid[grid["category"] == "Child"].groupby("traveler")["factor"].max()
+    per["ff"] = np.where(per["category"] == "Adult", 1.0, child_ff.reindex(per.index).fillna(0.0))
+
+    vehicle, commission, extras = _trip_charges(tables, trip, per)
+
+    # Round up to the next dollar, summed in the same order as the original per-traveler loop
+    subtotal = per["acc"] + per["park"] + per["veh"] + per["comm"] + per["extra"]
+    per["total"] = np.ceil(subtotal).astype(int)
+
+    return {
+        "nights": grid,
+        "travelers": per,
+        "vehicle": vehicle,
+        "commission": commission,
+        "extras": extras,
+        "overlaps": overlaps,
+        "days": vehicle["days"],
+        "total": int(per["total"].sum()),
+    }
+
+
+def price_table(result):
+    """Rows for the editable Detailed Price Table."""
+    per = result["travelers"]
+    return [{"Category": label, "Cost": int(cost)} for label, cost in zip(per["label"], per["total"])]
+
+
+def _stay_rates(tables, camp, start_date):
+    """Adult rate per room type summed over the camp's nights; inf where any night has no rate."""
+    stay = tables["acc_index"].resolve((camp["loc"], camp["prop"], camp["type"]), start_date, camp["nights"])
+    if stay["gaps"]:
+        gap_days = ", ".join(str(d.date()) for d in stay["gaps"])
+        raise PricingError([f"Rate not found in Excel for {camp['prop']} ({camp['type']}) on {gap_days}"])
+    totals = {}
+    for r_type in ROOM_TYPES:
+        nightly = stay["rows"][rate_column(r_type)].to_numpy(dtype=float)
+        usable = not np.isnan(nightly).any() and (nightly != 0).all()
+        totals[r_type] = float(nightly.sum()) if usable else np.inf
+    return totals
+
+
+def _fill_rooms(r_type, adults, children, chaperone):
+    # Rooms are filled in traveler order; with a chaperone every room starts with an adult
+    size = ROOM_CAPACITY[r_type]
+    count = (len(adults) + len(children)) // size
+    if chaperone:
+        rooms = [[a] for a in adults[:count]]
+        rest = children + adults[count:]
+    else:
+        rooms = [[] for _ in range(count)]
+        rest = adults + children
+    for room in rooms:
+        while len(room) < size:
+            room.append(rest.pop(0))
+        room.sort()
+    return rooms
+
+
+def _cheapest_split(adults, children, rates, chaperone):
+    """Cheapest full-room split of one group; ({room type: [rooms]}, cost) or None.
+
+    `adults` are traveler ids, `children` (id, form factor) pairs and
+    `rates` the stay's adult rate per room type. A traveler costs their
+    room type's rate times their factor, so only how many adults and which
+    children sleep in each room type matters: counts are enumerated and
+    the dearest children go to the cheapest room type they are allowed in.
+    Rooms are always full, since the sheet rates are per person at that
+    occupancy; with `chaperone` no child sleeps without an adult.
+    """
+    kids = sorted(children, key=lambda c: (-c[1], c[0]))
+    factors = np.array([f for _, f in kids], dtype=float)
+    n_a, n_c = len(adults), len(kids)
+    best = None
+    for a2 in range(n_a + 1):
+        for a3 in range(n_a - a2 + 1):
+            a1 = n_a - a2 - a3
+            if (a1 and rates["Single"] == np.inf) or (a2 and rates["Double"] == np.inf) or (a3 and rates["Triple"] == np.inf):
+                continue
+            c1_range = [0] if chaperone else range(n_c + 1)
+            for c1 in c1_range:
+                for c2 in range(n_c - c1 + 1):
+                    c3 = n_c - c1 - c2
+                    if (a2 + c2) % 2 or (a3 + c3) % 3:
+                        continue
+                    # Each Double needs 1 adult (a2 >= rooms), each Triple 1 adult (a3 >= rooms)
+                    if chaperone and (a2 < c2 or 2 * a3 < c3):
+                        continue
+                    counts = {"Single": c1, "Double": c2, "Triple": c3}
+                    if any(counts[r] and rates[r] == np.inf for r in ROOM_TYPES):
+                        continue
+                    # Dearest children into the cheapest room type (rearrangement inequality)
+                    order = sorted(ROOM_TYPES, key=lambda r: rates[r])
+                    cost = sum(rates[r] * n for r, n in zip(ROOM_TYPES, (a1, a2, a3)) if n)
+                    pos, taken = 0, {}
+                    for r_type in order:
+                        taken[r_type] = kids[pos:pos + counts[r_type]]
+                        if counts[r_type]:
+                            cost += rates[r_type] * factors[pos:pos + counts[r_type]].sum()
+                        pos += counts[r_type]
+                    rooms = a1 + c1 + (a2 + c2) // 2 + (a3 + c3) // 3
+                    # Ties (e.g. free infants) go to the split with fewer rooms
+                    key = (round(cost, 6), rooms)
+                    if best is None or key < best[0]:
+                        best = (key, cost, (a1, a2, a3), taken)
+    if best is None:
+        return None
+    _, cost, (a1, a2, a3), taken = best
+    adult_ids = sorted(adults)
+    by_type = {"Single": adult_ids[:a1], "Double": adult_ids[a1:a1 + a2], "Triple": adult_ids[a1 + a2:]}
+    split = {r_type: _fill_rooms(r_type, by_type[r_type], sorted(c for c, _ in taken[r_type]), chaperone)
+             for r_type in ROOM_TYPES}
+    return split, cost
+
+
+def assign_camp_rooms(tables, camp, start_date, registry, groups=(), chaperone=True):
+    """Cheapest room assignments for one camp: ({room type: [[traveler ids]]}, accommodation cost).
+
+    `camp` needs `loc`, `type`, `prop` and `nights`. `groups` are lists of
+    traveler ids (e.g. families) that only share rooms among themselves;
+    everyone else is roomed together. Raises PricingError when a group
+    cannot be roomed (e.g. a lone child with `chaperone`).
+    """
+    rates = _stay_rates(tables, camp, pd.Timestamp(start_date))
+    grouped = [list(group) for group in groups if group]
+    seen = {t for group in grouped for t in group}
+    units = grouped + [[t.id for t in registry if t.id not in seen]]
+    assignments, total, problems = {r_type: [] for r_type in ROOM_TYPES}, 0.0, []
+    for unit in units:
+        if not unit:
+            continue
+        people = [registry[t] for t in unit]
+        adults = [t.id for t in people if t.category == "Adult"]
+        children = [(t.id, t.factor_at(camp["prop"])) for t in people if t.category != "Adult"]
+        found = _cheapest_split(adults, children, rates, chaperone)
+        if found is None:
+            labels = ", ".join(t.label for t in people)
+            problems.append(f"No valid rooming for {labels} at {camp['prop']} ({camp['type']})")
+            continue
+        split, cost = found
+        for r_type in ROOM_TYPES:
+            assignments[r_type].extend(split[r_type])
+        total += cost
+    if problems:
+        raise PricingError(problems)
+    return assignments, total
+
+
+def auto_assign_rooms(tables, trip, groups=(), chaperone=True):
+    """Cheapest room assignments for every camp of `trip` (as passed to price_trip).
+
+    Returns one {room type: [[traveler ids]]} per camp, ready for the
+    camps' `assignments`; raises PricingError listing every camp that
+    cannot be roomed.
+    """
+    results, problems = [], []
+    stay_date = pd.Timestamp(trip["start"])
+    for camp in trip["camps"]:
+        try:
+            results.append(assign_camp_rooms(tables, camp, stay_date, trip["travelers"], groups, chaperone)[0])
+        except PricingError as err:
+            problems.extend(err.problems)
+        stay_date += pd.Timedelta(days=camp["nights"])
+    if problems:
+        raise PricingError(problems)
+    return results
+
+
+def _night_rates(rate_matrix, rows):
+    # Single/Double/Triple rate of each looked-up row; NaN for a gap or a 0 rate, which price_trip rejects
+    rates = np.where((rows >= 0)[:, None], rate_matrix[np.maximum(rows, 0)], np.nan)
+    rates[rates == 0] = np.nan
+    return rates
+
+
+@timed()
+def price_calendar(tables, trip, first_start, days=365):
+    """Prices the same trip for every start date in a window, in one vectorised pass.
+
+    `trip` is as for price_trip; its own dates only give the trip length.
+    Accommodation and park fees are looked up for every (start, night) pair
+    at once; vehicle, commission and extras do not depend on the date and
+    are worked out once. Returns a dict with:
+
+    - `calendar`: one row per start date with `total`, `acc`, `park` and a
+      rounded total per traveler label; NaN where a night has no rate or fee
+    - `boundaries`: the season and park-fee changes the trip's nights cross,
+      with the group's cost of that camp night before and after
+    - `cheapest`: the start date with the lowest total (None if none priced)
+    """
+    registry = trip["travelers"]
+    length = (pd.Timestamp(trip["end"]) - pd.Timestamp(trip["start"])).days
+    first = np.datetime64(pd.Timestamp(first_start).date(), 'D').astype(np.int64)
+    starts = first + np.arange(days)
+    n_travelers = len(registry)
+    acc = np.zeros((days, n_travelers))
+    park = np.zeros((days, n_travelers))
+    groups = [(t.category, t.age) for t in registry]
+    acc_index, park_index = tables["acc_index"], tables["park_index"]
+    rate_matrix = acc_index.frame[[rate_column(r_type) for r_type in ROOM_TYPES]].to_numpy(dtype=float)
+    seasons = acc_index.frame['Season'].astype(str).to_numpy() if 'Season' in acc_index.frame else None
+    ff = {t.id: 1.0 if t.category == "Adult" else 0.0 for t in registry}
+    boundaries = []
+
+    offset = 0
+    for camp_idx, camp in enumerate(trip["camps"]):
+        key, nights = (camp["loc"], camp["prop"], camp["type"]), camp["nights"]
+        night_days = (starts[:, None] + offset + np.arange(nights)).ravel()
+        occupants = []
+        for type_pos, r_type in enumerate(ROOM_TYPES):
+            for room in camp["assignments"].get(r_type, []):
+                for t_id in room:
+                    occupants.append((t_id, type_pos, registry[t_id].factor_at(camp["prop"])))
+        for t_id, _, factor in occupants:
+            if registry[t_id].category != "Adult":
+                ff[t_id] = max(ff[t_id], factor)
+
+        # --- Accommodation: start x night x room type rates, summed over the camp's nights ---
+        rows, _ = acc_index.lookup(key, night_days)
+        stay = _night_rates(rate_matrix, rows).reshape(days, nights, -1).sum(axis=1)
+        for t_id, type_pos, factor in occupants:
+            acc[:, t_id] += stay[:, type_pos] * factor
+
+        # --- Park fees: one lookup for all W x nights ---
+        fees = park_index.resolve(camp["loc"], night_days.astype('datetime64[D]'), groups)
+        park += fees.reshape(days, nights, n_travelers).sum(axis=1)
+
+        # --- Season boundaries crossed by this camp's nights somewhere in the window ---
+        span = (starts[0] + offset - 1, starts[-1] + offset + nights - 1)
+        for day in acc_index.changes(key, *span):
+            before_after, _ = acc_index.lookup(key, np.array([day - 1, day]))
+            rates = _night_rates(rate_matrix, before_after)
+            cost = sum(rates[:, type_pos] * factor for _, type_pos, factor in occupants)
+            change = " → ".join("no rate" if r < 0 else (seasons[r] if seasons is not None else f"row {r}") for r in before_after)
+            boundaries.append({"date": day, "camp": camp_idx + 1, "kind": "season", "where": f"{camp['prop']} ({camp['type']})",
+                               "change": change, "night before": cost[0], "night after": cost[1]})
+        for day in park_index.changes(camp["loc"], *span):
+            night_fees = park_index.resolve(camp["loc"], np.array([day - 1, day]).astype('datetime64[D]'), groups).sum(axis=1)
+            boundaries.append({"date": day, "camp": camp_idx + 1, "kind": "park fee", "where": camp["loc"],
+                               "change": "park fees", "night before": night_fees[0], "night after": night_fees[1]})
+        offset += nights
+
+    # --- Date-independent charges, once, exactly as price_trip splits them ---
+    per = pd.DataFrame({"category": [t.category for t in registry], "ff": [ff[t.id] for t in registry]},
+                       index=[t.id for t in registry])
+    _trip_charges(tables, dict(trip, end=pd.Timestamp(trip["start"]) + pd.Timedelta(days=length)), per)
+    veh, comm, extra = (per[col].to_numpy() for col in ("veh", "comm", "extra"))
+
+    # Summed in price_trip's order so both round up to the same dollar
+    subtotal = acc + park + veh + comm + extra
+    priced = np.isfinite(subtotal).all(axis=1)
+    per_traveler = np.full(subtotal.shape, np.nan)
+    per_traveler[priced] = np.ceil(subtotal[priced])
+    dates = pd.to_datetime(starts.astype('datetime64[D]'))
+    calendar = pd.DataFrame(per_traveler, index=dates, columns=[t.label for t in registry])
+    calendar.insert(0, "park", np.where(priced, park.sum(axis=1), np.nan))
+    calendar.insert(0, "acc", np.where(priced, acc.sum(axis=1), np.nan))
+    calendar.insert(0, "total", per_traveler.sum(axis=1))
+    calendar.index.name = "start"
+
+    boundaries = pd.DataFrame(boundaries, columns=["date", "camp", "kind", "where", "change", "night before", "night after"])
+    boundaries = boundaries[boundaries["night before"].fillna(-1) != boundaries["night after"].fillna(-1)]
+    boundaries["date"] = pd.to_datetime(boundaries["date"].to_numpy(dtype=np.int64).astype('datetime64[D]'))
+    boundaries = boundaries.sort_values(["date", "camp"], kind="stable").reset_index(drop=True)
+    totals = calendar["total"]
+    return {
+        "calendar": calendar,
+        "boundaries": boundaries,
+        "cheapest": totals.idxmin() if totals.notna().any() else None,
+    }
@@ -1,26 +1,33 @@
 import streamlit as st
 import pandas as pd
+import altair as alt
 from datetime import timedelta, datetime
-import os
 import math
-import io
 import time
 # NEW: Import the Word logic from your second file
-from file import generate_word_quotation
+from file import cached_word_quotation, cached_pdf_quotation, render_cache_stats
 # NEW: Import Database logic
-from database import init_db, save_quote_data, search_quotes, delete_quote
+from database import init_db, search_quotes, delete_quote, pool_stats, queue_quote_save, save_status
+from rates import load_country_rates, available_countries, RATES_SOURCE
+from pricing import (price_trip, price_table, price_calendar, build_itinerary, assign_camp_rooms, PricingError,
+                     ROOM_TYPES, TravelerRegistry, AIRPORT_MAP)
+import timing
+
+# --- TIMING SPANS ---
+# Only a master admin with "Record timings" on collects spans; everywhere
+# else timing.span/timed are no-ops. The panel shows the previous rerun.
+if st.session_state.get("is_master") and st.session_state.get("timing_on"):
+    last_rerun_timing = st.session_state.get("timing_recorder")
+    st.session_state.timing_recorder = timing.Recorder(st.session_state.setdefault("timing_history", {}))
+    timing.activate(st.session_state.timing_recorder)
+else:
+    last_rerun_timing = None
+    timing.activate(None)
 
 # --- INITIALIZE DATABASE ---
+# Migrations run on the first rerun of this server process; later reruns skip the DB entirely
 init_db()
 
-# --- 1. Define the Mapping ---
-AIRPORT_MAP = {
-    "Kenya": "Nairobi",
-    "Tanzania": "Kilimanjaro",
-    "Uganda": "Entebbe",
-    "Rwanda": "Kigali"
-}
-
 # --- PAGE CONFIGURATION ---
 st.set_page_config(page_title="Jaws Africa Safari Planner", layout="wide")
 
@@ -75,7 +82,7 @@ choice = st.sidebar.radio("Navigate", menu_options,label_visibility="collapsed")
 # If the user clicks "Create Quote", clear the data to start fresh
 if choice == "Create Quote" and st.session_state.current_page != "Create Quote":
     # Keep login/activity but wipe everything else
-    keys_to_keep = ['logged_in', 'is_master', 'last_activity']
+    keys_to_keep = ['logged_in', 'is_master', 'last_activity', 'timing_on', 'timing_history', 'timing_recorder']
     for k in list(st.session_state.keys()):
         if k not in keys_to_keep:
             del st.session_state[k]
@@ -85,6 +92,22 @@ if choice == "Create Quote" and st.session_state.current_page != "Create Quote":
 st.session_state.current_page = choice
 app_page = choice
 
+# Master admin can see how the shared Postgres pool is doing
+if st.session_state.get("is_master"):
+    with st.sidebar.expander("🔌 DB Pool"):
+        st.json(pool_stats())
+    with st.sidebar.expander("⏱️ Timings"):
+        st.toggle("Record timings", key="timing_on")
+        if last_rerun_timing is not None:
+            timing_rows = last_rerun_timing.summary()
+            if timing_rows:
+                st.dataframe(pd.DataFrame(timing_rows), hide_index=True, use_container_width=True)
+                st.caption(f"Calls and ms are for the last rerun; p50/p95 over the last {timing.HISTORY_SIZE} calls.")
+            else:
+                st.caption("No spans in the last rerun.")
+        st.caption("Rendered quotations: cache hits per tier since the server started")
+        st.json(render_cache_stats())
+
 if app_page == "Logout":
     # Correct way to clear session state:
     for key in list(st.session_state.keys()):
@@ -99,23 +122,24 @@ if app_page == "Search Database":
     st.markdown('<p class="section-header">📂 Quote Database</p>', unsafe_allow_html=True)
     search_query = st.text_input("Search Client Name")
     
-    from database import delete_quote, search_quotes
-    import json
+    from database import delete_quote, search_quotes, get_quote_config
+
+    # Page cursor is reset whenever the search text changes
+    if st.session_state.get("search_cursor", {}).get("query") != search_query:
+        st.session_state.search_cursor = {"query": search_query, "after": None, "before": None}
+    cursor = st.session_state.search_cursor
 
-    db_results = search_quotes(search_query)
+    db_results, next_cursor, prev_cursor = search_quotes(search_query, after_id=cursor["after"], before_id=cursor["before"])
 
     if db_results:
-        # 1. Prepare Data
+        # 1. Prepare Data (list columns only; the config is fetched for the selected row)
         table_rows = []
-        for i, row in enumerate(db_results):
-            # Parse config to get the Tour Code
-            config_data = json.loads(row[4])
+        for row in db_results:
             table_rows.append({
-                "Tour Code": config_data.get('code', 'N/A'),
+                "Tour Code": row[4] or 'N/A',
                 "Client (Country)": f"{row[1]} ({row[2]})",
                 "Date": row[3].split(" ")[0],
                 "db_id": row[0],
-                "config": row[4]
             })
         
         df = pd.DataFrame(table_rows)
@@ -130,6 +154,12 @@ if app_page == "Search Database":
             selection_mode="single-row"
         )
 
+        p_col1, p_col2 = st.columns(2)
+        if prev_cursor is not None and p_col1.button("⬅️ Newer", use_container_width=True):
+            cursor.update(after=None, before=prev_cursor); st.rerun()
+        if next_cursor is not None and p_col2.button("Older ➡️", use_container_width=True):
+            cursor.update(after=next_cursor, before=None); st.rerun()
+
         # 3. Handle Actions based on Selection
         if len(event.selection.rows) > 0:
             selected_row_idx = event.selection.rows[0]
@@ -137,18 +167,32 @@ if app_page == "Search Database":
             
             st.write(f"**Selected:** {real_data['Tour Code']}")
             col1, col2 = st.columns(2)
+            # One row by primary key; the quotation itself is still rendered only on click
+            selected_config = get_quote_config(int(real_data['db_id']))
             
             with col1:
-                # Word Generation Logic
-                saved_config = json.loads(real_data['config'])
-                word_bytes = generate_word_quotation(saved_config)
-                st.download_button(
-                    label=f"📥 Download Quote: {real_data['Client (Country)']}", 
-                    data=word_bytes, 
-                    file_name=f"Quote_{real_data['Client (Country)']}.docx",
-                    type="primary",
-                    use_container_width=True
-                )
+                if selected_config is None:
+                    st.error("This quote no longer exists (it may have been deleted). Refresh the search.")
+                else:
+                    # Word Generation Logic: runs only when the download is clicked, then served from the cache
+                    def render_selected_quote(config=selected_config):
+                        return cached_word_quotation(config)
+                    st.download_button(
+                        label=f"📥 Download Quote: {real_data['Client (Country)']}", 
+                        data=render_selected_quote, 
+                        file_name=f"Quote_{real_data['Client (Country)']}.docx",
+                        type="primary",
+                        use_container_width=True
+                    )
+                    def render_selected_pdf(config=selected_config):
+                        return cached_pdf_quotation(config)
+                    st.download_button(
+                        label="📄 Download PDF",
+                        data=render_selected_pdf,
+                        file_name=f"Quote_{real_data['Client (Country)']}.pdf",
+                        mime="application/pdf",
+                        use_container_width=True
+                    )
             
             with col2:
                 # Delete Logic (Master Admin Only)
@@ -162,7 +206,66 @@ if app_page == "Search Database":
                         st.rerun()
     else:
         st.info("No quotes found.")
-    
+
+    # --- BULK EXPORT ---
+    with st.expander("📦 Bulk Export (ZIP)", expanded=False):
+        from database import find_quotes_for_export, iter_quote_configs, EXPORT_MAX_QUOTES
+        from file import build_export_zip
+        from pathlib import Path
+
+        b_col1, b_col2 = st.columns(2)
+        export_country = b_col1.selectbox("Country", ["All"] + list(AIRPORT_MAP.keys()), key="export_country")
+        export_dates = b_col2.date_input("Travel start between", value=(), key="export_dates")
+        start_from = export_dates[0] if len(export_dates) > 0 else None
+        start_to = export_dates[1] if len(export_dates) > 1 else None
+
+        # Queried only when asked for, and at most EXPORT_MAX_QUOTES rows
+        if st.button("🔎 Find Quotes"):
+            st.session_state.export_matches = find_quotes_for_export(
+                None if export_country == "All" else export_country, start_from, start_to)
+            st.session_state.pop("export_ids", None)
+        matches = st.session_state.get("export_matches")
+        if matches is not None:
+            if len(matches) == EXPORT_MAX_QUOTES:
+                st.warning(f"⚠️ Showing the newest {EXPORT_MAX_QUOTES} matches only. Narrow the filters to export older quotes.")
+            labels = {row[0]: f"{row[3] or 'N/A'} - {row[1]} ({row[2]})" for row in matches}
+            export_ids = st.multiselect("Quotes to export", list(labels), default=list(labels),
+                                        format_func=labels.get, key="export_ids")
+
+            if st.button(f"🗜️ Build ZIP ({len(export_ids)} quotes)", disabled=not export_ids):
+                names = {row[0]: f"Quote_{row[3] or row[0]}_{row[1]}.docx".replace("/", "-") for row in matches}
+                bar = st.progress(0.0, text="Rendering quotes...")
+                def show_progress(done, total):
+                    bar.progress(done / total, text=f"Rendered {done} of {total}")
+                if st.session_state.get("export_zip_path"):
+                    Path(st.session_state.pop("export_zip_path")).unlink(missing_ok=True)
+                # Configs are fetched in batches and each rendered .docx goes straight into the
+                # ZIP on disk, so neither grows in memory with the number of quotes
+                zip_path, failed = build_export_zip(
+                    ((names[qid], config) for qid, config in iter_quote_configs(export_ids)),
+                    total=len(export_ids), progress=show_progress)
+                if zip_path:
+                    st.session_state.export_zip_path = zip_path
+                st.session_state.export_failed = failed
+
+        failed = st.session_state.get("export_failed")
+        if failed:
+            st.warning(f"⚠️ {len(failed)} quote(s) could not be rendered and are not in the ZIP:")
+            st.dataframe(pd.DataFrame(failed, columns=["File", "Error"]), hide_index=True, use_container_width=True)
+        zip_path = st.session_state.get("export_zip_path")
+        if zip_path and not Path(zip_path).exists():
+            # Already downloaded (the file is removed once served)
+            del st.session_state.export_zip_path
+        elif zip_path:
+            def serve_export_zip(path=zip_path):
+                # Read from disk only when the download is clicked, then removed
+                data = Path(path).read_bytes()
+                Path(path).unlink(missing_ok=True)
+                return data
+            st.download_button("📥 Download ZIP", serve_export_zip,
+                               f"Quotes_{datetime.now():%Y%m%d_%H%M}.zip", mime="application/zip",
+                               use_container_width=True)
+
     st.stop()
 # --- 5. MAIN GENERATOR PAGE (YOUR ORIGINAL 508 LINES START HERE) ---
 
@@ -240,37 +343,57 @@ st.markdown("""
 
 # --- UTILITY FUNCTIONS ---
 def get_available_countries():
-    """Scans directory for .xlsx files and ignores temporary Excel owner files."""
-    return sorted([f.replace('.xlsx', '') for f in os.listdir('.') 
-                   if f.endswith('.xlsx') and not f.startswith('~$')])
+    """Countries with a rate workbook (or, with RATES_SOURCE=db, a published rate version)."""
+    return available_countries()
 
+@timing.timed("load_country_data")
 def load_country_data(country_name):
-    file_path = f"{country_name}.xlsx"
-    if not os.path.exists(file_path): return None
-    xls = pd.ExcelFile(file_path)
-    df_acc = pd.read_excel(xls, 'Accommodation Cost (Adults)')
-    df_park = pd.read_excel(xls, 'Park Fees')
-    df_comm = pd.read_excel(xls, 'Jaws Africa Commission')
-    df_veh = pd.read_excel(xls, 'Vehicle Cost')
-    # NEW: Load Children Policy
-    df_child_policy = pd.read_excel(xls, 'Children Rates Policy')
-    
-    for df, start, end in [(df_acc, 'Date From', 'Date To'), (df_park, 'Dates From', 'Dates To')]:
-        df[start] = pd.to_datetime(df[start])
-        df[end] = pd.to_datetime(df[end])
-    return df_acc, df_park, df_comm, df_veh, df_child_policy
+    # Compiled once per workbook/rate version and shared by all sessions (see rates.py)
+    return load_country_rates(country_name)
+
+def saved_quote_config(prepared):
+    """The prepared quote, with the tour code the writer saved it under once it is known."""
+    code = save_status(prepared["ticket"]).get("code")
+    return dict(prepared["quote"], code=code) if code else prepared["quote"]
+
+def show_settled_status(status):
+    if status["state"] == "saved":
+        st.success(f"✅ Saved to Database as {status['code']}!" if status.get("code") else "✅ Saved to Database!")
+    elif status["state"] == "spooled":
+        st.warning("⚠️ Database unreachable. The quote is kept on this server and will be saved automatically.")
+    elif status["state"] == "failed":
+        st.error(f"❌ Could not save the quote: {status.get('error')}")
+
+@st.fragment(run_every=1)
+def poll_save_status(ticket):
+    """Polls the background save of a quote while it is pending."""
+    status = save_status(ticket)
+    if status["state"] == "pending":
+        st.info("💾 Saving to database...")
+    else:
+        # Settled: shown in place, without rerunning the app. The next rerun
+        # (any widget) finds it settled and stops calling this fragment.
+        show_settled_status(status)
+
+def show_save_status(ticket):
+    """Shows where the background save of a quote ended up (saved, spooled or failed)."""
+    status = save_status(ticket)
+    if status["state"] == "pending":
+        poll_save_status(ticket)
+    else:
+        show_settled_status(status)
 
 st.title("🦁 Jaws Africa Safari Planner")
 
-available_countries = get_available_countries()
-if not available_countries:
-    st.error("No Excel files found.")
+country_options = get_available_countries()
+if not country_options:
+    st.error("No published rates found." if RATES_SOURCE == "db" else "No Excel files found.")
     st.stop()
 
 st.markdown('<p class="section-header">1. Select Destination Country</p>', unsafe_allow_html=True)
 selected_country = st.selectbox(
     "Destination", # This label will be hidden
-    options=available_countries, 
+    options=country_options, 
     index=None, 
     label_visibility="collapsed" 
 )
@@ -278,10 +401,12 @@ selected_country = st.selectbox(
 if selected_country:
     data = load_country_data(selected_country)
     if data:
-        df_acc, df_park, df_comm, df_veh, df_child_policy = data
+        rate_tables = data
+        # {location: {room type: [property, ...]}}, sorted and built once per rate-table load
+        camp_index = rate_tables["camp_index"]
 
         st.markdown('<p class="section-header">2. Select Parks/Locations</p>', unsafe_allow_html=True)
-        all_parks = sorted(df_acc['Location'].unique().tolist())
+        all_parks = list(camp_index)
         selected_parks = []
         cols = st.columns(3)
         for idx, park in enumerate(all_parks):
@@ -361,9 +486,29 @@ if selected_country:
             st.markdown('<p class="section-header">4. Accommodation & Room Configuration</p>', unsafe_allow_html=True)
             if 'camps_count' not in st.session_state: st.session_state.camps_count = 1
             
-            pax_needing_rooms = adult_names + [c["id"] for c in child_data]
+            travelers = TravelerRegistry.build(num_adults, [c["age"] for c in child_data], rate_tables["child_index"])
+            pax_needing_rooms = travelers.labels()
             total_required_room_pax = len(pax_needing_rooms)
 
+            # Auto-assign rooms every camp at the lowest accommodation cost (pricing.assign_camp_rooms)
+            # instead of one checkbox per traveler per room; "Edit rooms manually" hands the result to the checkboxes.
+            auto_rooms = st.toggle("🪄 Auto-assign rooms (cheapest)", key="auto_rooms")
+            if auto_rooms:
+                chaperone = st.checkbox("Children share a room with an adult", value=True, key="auto_chaperone")
+            auto_result = st.session_state.auto_result = {}
+
+            def edit_auto_rooms():
+                """Copies the auto-assigned rooms into the manual room counts and checkboxes."""
+                for camp_idx, rooms in st.session_state.auto_result.items():
+                    for key in [k for k in st.session_state if str(k).startswith(f"chk_{camp_idx}_")]:
+                        del st.session_state[key]
+                    for r_type, type_key in zip(ROOM_TYPES, ("s", "d", "t")):
+                        st.session_state[f"{type_key}_count_{camp_idx}"] = len(rooms[r_type])
+                        for r_idx, room in enumerate(rooms[r_type]):
+                            for person in room:
+                                st.session_state[f"chk_{camp_idx}_{type_key}_{r_idx}_{person}"] = True
+                st.session_state.auto_rooms = False
+
             planned_nights, camp_data = 0, []
             for i in range(st.session_state.camps_count):
                 with st.container():
@@ -372,19 +517,19 @@ if selected_country:
                     c1, c2, c3 = st.columns(3)
                     with c1:
                         loc = st.selectbox("Location", selected_parks, key=f"loc_{i}")
-                        loc_df = df_acc[df_acc['Location'] == loc]
+                        loc_types = camp_index.get(loc, {})
                     with c2:
-                        acc_type = st.selectbox("Room Type", sorted(loc_df['Room Type'].unique()), key=f"type_{i}")
-                        type_df = loc_df[loc_df['Room Type'] == acc_type]
+                        acc_type = st.selectbox("Room Type", list(loc_types), key=f"type_{i}")
+                        type_props = loc_types.get(acc_type, [])
                     with c3:
-                        prop = st.selectbox("Property", sorted(type_df['Property'].unique()), key=f"prop_{i}")
-                        prop_df = type_df[type_df['Property'] == prop]
+                        prop = st.selectbox("Property", type_props, key=f"prop_{i}")
 
                     st.markdown("**Room Quantities & Pax Assignment:**")
                     rc1, rc2, rc3, rc4 = st.columns(4)
-                    with rc1: s_count = st.number_input("Single Rooms", min_value=0, step=1, key=f"s_count_{i}")
-                    with rc2: d_count = st.number_input("Double Rooms", min_value=0, step=1, key=f"d_count_{i}")
-                    with rc3: t_count = st.number_input("Triple Rooms", min_value=0, step=1, key=f"t_count_{i}")
+                    if not auto_rooms:
+                        with rc1: s_count = st.number_input("Single Rooms", min_value=0, step=1, key=f"s_count_{i}")
+                        with rc2: d_count = st.number_input("Double Rooms", min_value=0, step=1, key=f"d_count_{i}")
+                        with rc3: t_count = st.number_input("Triple Rooms", min_value=0, step=1, key=f"t_count_{i}")
                     
                     with rc4:
                         rem_n = total_nights - planned_nights
@@ -393,6 +538,23 @@ if selected_country:
                     assigned_at_this_camp = []
                     room_assignments = {"Single": [], "Double": [], "Triple": []}
 
+                    if auto_rooms:
+                        s_count = d_count = t_count = 0
+                        camp = {"loc": loc, "type": acc_type, "prop": prop, "nights": nights}
+                        try:
+                            rooms_by_id, auto_cost = assign_camp_rooms(rate_tables, camp, travel_start + timedelta(days=planned_nights),
+                                                                       travelers, chaperone=chaperone)
+                            room_assignments = {r_type: [[travelers[t].label for t in room] for room in rooms]
+                                                for r_type, rooms in rooms_by_id.items()}
+                            auto_result[i] = room_assignments
+                            for r_type in ROOM_TYPES:
+                                for r_idx, room in enumerate(room_assignments[r_type]):
+                                    st.markdown(f"- {r_type} Room {r_idx+1}: {', '.join(room)}")
+                                    assigned_at_this_camp.extend(room)
+                            st.caption(f"Accommodation at {prop}: ${auto_cost:,.2f}")
+                        except PricingError as err:
+                            for problem in err.problems: st.error(f"❌ {problem}")
+
                     def create_pax_selector(label, count, max_pax, camp_idx, type_key):
                         for r_idx in range(count):
                             available = [p for p in pax_needing_rooms if p not in assigned_at_this_camp]
@@ -424,11 +586,14 @@ if selected_country:
                     planned_nights += nights
                     st.markdown('</div>', unsafe_allow_html=True)
                     camp_data.append({
-                        "prop": prop, "loc": loc, "nights": nights, "df": prop_df,
+                        "prop": prop, "loc": loc, "type": acc_type, "nights": nights,
                         "assignments": room_assignments,
                         "valid": (len(assigned_at_this_camp) == total_required_room_pax)
                     })
 
+            if auto_rooms and auto_result:
+                st.button("✏️ Edit rooms manually", on_click=edit_auto_rooms)
+
             if planned_nights < total_nights:
                 st.warning(f"⚠️ {total_nights - planned_nights} nights remaining.")
                 if st.button("➕ Add More Camps"):
@@ -471,7 +636,48 @@ if selected_country:
                         st.markdown("---")
 
                 st.button("➕ Add Item Row", on_click=add_item_row)
-                
+
+                # --- 6. DEPARTURE DATE SWEEP ---
+                # Same camps, rooms, travelers and extras priced for every start date in a window (pricing.price_calendar)
+                with st.expander("📅 Cheapest Departure (Date Sweep)"):
+                    sw1, sw2 = st.columns(2)
+                    sweep_from = sw1.date_input("Sweep from", value=travel_start, format="DD/MM/YYYY", key="sweep_from")
+                    sweep_days = sw2.number_input("Days to sweep", min_value=7, max_value=730, value=365, step=7, key="sweep_days")
+                    if st.button("🔍 Price every start date"):
+                        if not all(c['valid'] for c in camp_data):
+                            st.error("❌ Complete the room assignments first.")
+                        else:
+                            sweep_trip = {
+                                "start": travel_start, "end": travel_end, "vehicles": num_vehicles,
+                                "travelers": travelers,
+                                "camps": travelers.camps_by_id(camp_data),
+                                "extras": travelers.extras_by_id(st.session_state.extra_items),
+                            }
+                            sweep = price_calendar(rate_tables, sweep_trip, sweep_from, int(sweep_days))
+                            cal = sweep["calendar"]
+                            if sweep["cheapest"] is None:
+                                st.warning("⚠️ No start date in this window has rates for every night.")
+                            else:
+                                current = cal["total"].get(pd.Timestamp(travel_start))
+                                best = cal.loc[sweep["cheapest"], "total"]
+                                st.success(f"Cheapest start: {sweep['cheapest']:%d/%m/%Y} at ${best:,.0f}"
+                                           + (f" (${current - best:,.0f} less than {travel_start:%d/%m/%Y})" if current and current > best else ""))
+                                heat = cal["total"].rename("Total").reset_index()
+                                heat["Week"] = heat["start"] - pd.to_timedelta(heat["start"].dt.weekday, unit="D")
+                                heat["Day"] = heat["start"].dt.day_name().str[:3]
+                                st.altair_chart(alt.Chart(heat).mark_rect().encode(
+                                    x=alt.X("Week:T", title=None), y=alt.Y("Day:O", sort=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], title=None),
+                                    color=alt.Color("Total:Q", scale=alt.Scale(scheme="redyellowgreen", reverse=True)),
+                                    tooltip=[alt.Tooltip("start:T", format="%d/%m/%Y"), alt.Tooltip("Total:Q", format="$,.0f")],
+                                ).properties(height=200), use_container_width=True)
+                                st.markdown("**Season boundaries behind the price changes** (cost of that camp night for the group)")
+                                st.dataframe(sweep["boundaries"], hide_index=True, use_container_width=True,
+                                             column_config={"date": st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
+                                                            "night before": st.column_config.NumberColumn(format="$%.2f"),
+                                                            "night after": st.column_config.NumberColumn(format="$%.2f")})
+                                st.dataframe(cal.nsmallest(10, "total"), use_container_width=True,
+                                             column_config={"start": st.column_config.DateColumn("Start", format="DD/MM/YYYY")})
+
                 st.divider()
                 # --- 7. CALCULATION ENGINE ---
                 if st.button("🚀 GENERATE CALCULATION", type="primary"):
@@ -483,135 +689,61 @@ if selected_country:
                         st.error("❌ Cannot generate: Some room assignments are missing or invalid.")
                     else:
                         try:
-                            # Cost Tracking for Price Table (Round-up logic applied here)
-                            indiv_costs = {name: {"acc": 0.0, "park": 0.0, "veh": 0.0, "comm": 0.0, "extra": 0.0, "ff": 1.0} for name in adult_names}
-                            for c in child_data: indiv_costs[c['id']] = {"acc": 0.0, "extra": 0.0, "park": 0.0, "veh": 0.0, "comm": 0.0, "ff": 0.0}
-
-                            acc_total, park_total = 0.0, 0.0
-                            acc_report, park_report = "", ""
-                            calc_date = pd.to_datetime(travel_start)
-                            iti_base_data = []
                             start_airport = AIRPORT_MAP.get(selected_country, "Nairobi")
+                            trip = {
+                                "start": travel_start, "end": travel_end, "vehicles": num_vehicles,
+                                "travelers": travelers,
+                                "camps": travelers.camps_by_id(camp_data),
+                                "extras": travelers.extras_by_id(st.session_state.extra_items),
+                            }
+                            try:
+                                result = price_trip(rate_tables, trip)
+                            except PricingError as err:
+                                for problem in err.problems: st.error(f"❌ {problem}")
+                                st.stop()
+                            for prop, overlap_day in result["overlaps"]:
+                                st.warning(f"⚠️ Overlapping seasons for {prop} on {overlap_day.date()}. Using the first matching row.")
+
+                            # --- Accommodation report (one line per night) ---
+                            acc_report, park_report = "", ""
+                            for _, night in result["nights"].sort_values(["night", "slot"]).groupby("night", sort=True):
+                                detailed_math_parts = []
+                                for r_type in ROOM_TYPES:
+                                    in_type = night[night["room_type"] == r_type]
+                                    if in_type.empty: continue
+                                    adult_rate_pp = in_type["adult_rate"].iloc[0]
+                                    for child_name, factor in in_type[in_type["category"] == "Child"][["name", "factor"]].itertuples(index=False):
+                                        detailed_math_parts.append(f"{child_name} ({factor} * ${adult_rate_pp:,.0f})")
+                                    adults_this_type = int((in_type["category"] == "Adult").sum())
+                                    if adults_this_type > 0:
+                                        detailed_math_parts.insert(0, f"{adults_this_type} Adult(s) in {r_type} (@ ${adult_rate_pp:,.0f})")
+                                first = night.iloc[0]
+                                day_p_total = night.loc[night["category"] == "Adult", "park_fee"].sum()
+                                day_child_park_total = night.loc[night["category"] == "Child", "park_fee"].sum()
+                                acc_report += f"{first['date'].date()} | {first['prop'][:12]} | {' + '.join(detailed_math_parts)} = ${night['acc'].sum():,.2f}\n"
+                                park_report += f"{first['date'].date()} | {first['loc'][:15]} | Adults: ${day_p_total:,.2f} + Kids: ${day_child_park_total:,.2f} = ${(day_p_total + day_child_park_total):,.2f}\n"
+
+                            iti_base_data = build_itinerary(camp_data, start_airport)
+
+                            total_days_veh = result["days"]
+                            veh = result["vehicle"]
+                            v_rate, total_v_cost, v_per_head = veh["rate"], veh["total"], veh["per_head"]
 
-                            for camp in camp_data:
-                                for day_count in range(camp['nights']):
-                                    # --- Accommodation Engine ---
-                                    a_mask = (camp['df']['Date From'] <= calc_date) & (camp['df']['Date To'] >= calc_date)
-                                    if not any(a_mask):
-                                        st.error(f"❌ Rate not found in Excel for {camp['prop']} on {calc_date.date()}"); st.stop()
-                                    
-                                    rate_row = camp['df'][a_mask].iloc[0]
-                                    day_total_acc_cost = 0.0
-                                    detailed_math_parts = []
-
-                                    for r_type, assignments in camp['assignments'].items():
-                                        adult_rate_pp = float(rate_row[f"{r_type} (Cost Per Person/Per Night)"])
-                                        if len(assignments) > 0 and (pd.isna(adult_rate_pp) or adult_rate_pp == 0):
-                                            st.error(f"❌ Rate missing for {r_type} room at {camp['prop']}"); st.stop()
-
-                                        adults_this_type = 0
-                                        for room_pax_list in assignments:
-                                            # Adults logic
-                                            adults_in_room = [p for p in room_pax_list if "Adult" in p]
-                                            for a in adults_in_room:
-                                                indiv_costs[a]['acc'] += adult_rate_pp
-                                                adults_this_type += 1
-                                                day_total_acc_cost += adult_rate_pp
-
-                                            # Children logic
-                                            children_in_room = [p for p in room_pax_list if "Child" in p]
-                                            for person in children_in_room:
-                                                c_age = int(person.split("Age ")[1].replace(")", ""))
-                                                policy = df_child_policy[(df_child_policy['Property'] == camp['prop']) & (df_child_policy['Age From'] <= c_age) & (df_child_policy['Age To'] >= c_age)]
-                                                factor = float(policy.iloc[0]['Form Factor']) if not policy.empty else 1.0
-                                                
-                                                child_cost = adult_rate_pp * factor
-                                                indiv_costs[person]['acc'] += child_cost
-                                                indiv_costs[person]['ff'] = max(indiv_costs[person]['ff'], factor) 
-                                                day_total_acc_cost += child_cost
-                                                
-                                                child_id = person.split(" (")[0]
-                                                detailed_math_parts.append(f"{child_id} ({factor} * ${adult_rate_pp:,.0f})")
-
-                                        if adults_this_type > 0:
-                                            detailed_math_parts.insert(0, f"{adults_this_type} Adult(s) in {r_type} (@ ${adult_rate_pp:,.0f})")
-
-                                    math_string = " + ".join(detailed_math_parts)
-
-                                    # --- Park Fee Logic ---
-                                    p_mask_a = (df_park['Location'] == camp['loc']) & (df_park['Dates From'] <= calc_date) & (df_park['Dates To'] >= calc_date) & (df_park['Travellers  Category'] == 'Adult')
-                                    p_rate_a = float(df_park[p_mask_a].iloc[0]['Park Fee Per Night Per Person in USD'])
-                                    for a in adult_names: indiv_costs[a]['park'] += p_rate_a
-                                    day_p_total = p_rate_a * num_adults
-                                    
-                                    day_child_park_total = 0
-                                    if has_children == "Yes":
-                                        for c in child_data:
-                                            p_mask_c = (df_park['Location'] == camp['loc']) & (df_park['Dates From'] <= calc_date) & (df_park['Dates To'] >= calc_date) & (df_park['Travellers  Category'] == 'Child') & (df_park['Age from'] <= c['age']) & (df_park['Age to'] >= c['age'])
-                                            if not df_park[p_mask_c].empty:
-                                                pr_val = float(df_park[p_mask_c].iloc[0]['Park Fee Per Night Per Person in USD'])
-                                                indiv_costs[c['id']]['park'] += pr_val
-                                                day_child_park_total += pr_val
-
-                                    acc_total += day_total_acc_cost
-                                    park_total += day_p_total + day_child_park_total
-                                    acc_report += f"{calc_date.date()} | {camp['prop'][:12]} | {math_string} = ${day_total_acc_cost:,.2f}\n"
-                                    park_report += f"{calc_date.date()} | {camp['loc'][:15]} | Adults: ${day_p_total:,.2f} + Kids: ${day_child_park_total:,.2f} = ${(day_p_total + day_child_park_total):,.2f}\n"
-
-                                    iti_base_data.append({
-                                        "Day": f"Day-{len(iti_base_data)+1}", "From": start_airport if not iti_base_data else iti_base_data[-1]["To"], "To": camp['loc'],
-                                        "Activities": "Airport Pickup" if len(iti_base_data) == 0 else "Game Drive",
-                                        "Accommodation": camp['prop'], "Meal Plan": "BLD"
-                                    })
-                                    calc_date += timedelta(days=1)
-
-                            iti_base_data.append({"Day": f"Day-{len(iti_base_data)+1}", "From": iti_base_data[-1]["To"], "To": start_airport, "Activities": "Airport Drop", "Accommodation": "End", "Meal Plan": "BL"})
-
-                            # Vehicle Split (Paying pax only)
-                            total_days_veh = (travel_end - travel_start).days + 1
-                            v_rate = float(df_veh.iloc[0]['Cost in USD/Per Day'])
-                            total_v_cost = v_rate * total_days_veh * num_vehicles
-                            paying_pax_names = [n for n, d in indiv_costs.items() if d['ff'] > 0]
-                            v_per_head = total_v_cost / len(paying_pax_names) if paying_pax_names else 0
-                            for p in paying_pax_names: indiv_costs[p]['veh'] = v_per_head
-
-                            # Commission logic (Detailed calculation window)
                             comm_report = ""
-                            comm_base = float(df_comm.iloc[0]['Commission Per Person (USD)'])
-                            for p_name, data in indiv_costs.items():
-                                if "Adult" in p_name:
-                                    indiv_costs[p_name]['comm'] = comm_base
-                                    comm_report += f"{p_name}: $ {comm_base:,.0f}\n"
+                            comm_base = result["commission"]["base"]
+                            for _, row in result["travelers"].iterrows():
+                                if row["category"] == "Adult":
+                                    comm_report += f"{row['label']}: $ {comm_base:,.0f}\n"
                                 else:
-                                    c_comm = comm_base * data['ff']
-                                    indiv_costs[p_name]['comm'] = c_comm
-                                    comm_report += f"{p_name}: $ {comm_base:,.0f} * {data['ff']} = $ {c_comm:,.2f}\n"
-                            
-                            total_comm = sum(d['comm'] for d in indiv_costs.values())
-
-                            # Additional Charges Detailed Breakdown
-                            extra_report, total_extra = "", 0.0
-                            for item in st.session_state.extra_items:
-                                if not item['name']: continue
-                                item_adult_total = len(item['a_sel']) * item['a_price']
-                                item_child_total = 0
-                                for c_id in item['c_sel']:
-                                    price = item['dyn_prices'].get(c_id, item['c_price']) if item['dyn_c'] else item['c_price']
-                                    indiv_costs[c_id]['extra'] += price
-                                    item_child_total += price
-                                for a_id in item['a_sel']: indiv_costs[a_id]['extra'] += item['a_price']
-                                
-                                total_extra += item_adult_total + item_child_total
-                                extra_report += f"{item['name']} | Adults({len(item['a_sel'])}) ${item_adult_total:,.0f} + Kids({len(item['c_sel'])}) ${item_child_total:,.2f}\n"
+                                    comm_report += f"{row['label']}: $ {comm_base:,.0f} * {row['ff']} = $ {row['comm']:,.2f}\n"
+                            total_comm = result["commission"]["total"]
 
-                            # Price Breakdown Table (Rounding logic)
-                            price_table_data = []
-                            for name, d in indiv_costs.items():
-                                # Roundup to next integer as requested
-                                total_indiv = math.ceil(d['acc'] + d['park'] + d['veh'] + d['comm'] + d['extra'])
-                                price_table_data.append({"Category": name, "Cost": total_indiv})
+                            extra_report = ""
+                            for ex in result["extras"]:
+                                extra_report += f"{ex['name']} | Adults({ex['adults']}) ${ex['adult_total']:,.0f} + Kids({ex['children']}) ${ex['child_total']:,.2f}\n"
 
-                            grand_total = sum(r['Cost'] for r in price_table_data)
+                            price_table_data = price_table(result)
+                            grand_total = result["total"]
 
                             country_part = selected_country[:3].upper()
                             name_part = client_name[:3].replace(" ", "").upper() if 'client_name' in locals() else "GUE"
@@ -634,6 +766,7 @@ if selected_country:
                                 "code": tour_code
                             }
                             st.session_state.calculation_ready = True
+                            st.session_state.pop("prepared_quote", None)
                             
                             st.subheader("Quotation Breakdown")
                             st.markdown("#### 1. Accommodation (Detailed Calculation)")
@@ -695,16 +828,29 @@ if st.session_state.get('calculation_ready'):
         extra_names = [item['name'].strip() for item in st.session_state.extra_items if item['name'].strip()]
         q['extras_summary'] = ", ".join(extra_names[:-1]) + " and " + extra_names[-1] if len(extra_names) > 1 else (extra_names[0] if extra_names else "")
         
-        word_bytes = generate_word_quotation(q)
-        
         # --- SAVE TO DATABASE ---
-        from database import save_quote_data
         # We now save the data (q) instead of the file (word_bytes) to save Railway costs
-        # Use the new name and pass the 'q' dictionary instead of 'word_bytes'
-        save_quote_data(client_name, selected_country, q)
-        
-        st.success("✅ Quotation Generated & Saved to Database!")
-        st.download_button("📥 Download Quote", word_bytes, f"Quote_{client_name}.docx")
+        # Queued first so the background writer saves it while the document renders.
+        # The writer stores it as '<code>-N' if the tour code is taken (see save_status).
+        save_ticket = queue_quote_save(client_name, selected_country, q)
+
+        # Rendered now, while the writer saves; usually what the download below serves from the cache
+        cached_word_quotation(q)
+        # Kept in the session so the downloads and the save status outlive this button press
+        st.session_state.prepared_quote = {"quote": q, "client": client_name, "ticket": save_ticket}
+
+    prepared = st.session_state.get("prepared_quote")
+    if prepared:
+        st.success("✅ Quotation Generated!")
+        d_col1, d_col2 = st.columns(2)
+        # Both render when clicked, with the tour code the quote was saved under once it is known
+        def render_quote_word(prepared=prepared):
+            return cached_word_quotation(saved_quote_config(prepared))
+        def render_quote_pdf(prepared=prepared):
+            return cached_pdf_quotation(saved_quote_config(prepared))
+        d_col1.download_button("📥 Download Quote", render_quote_word, f"Quote_{prepared['client']}.docx")
+        d_col2.download_button("📄 Download PDF", render_quote_pdf, f"Quote_{prepared['client']}.pdf", mime="application/pdf")
+        show_save_status(prepared["ticket"])
 
     st.divider()
     if st.button("🔄 Start New Quote (Clear All)"):
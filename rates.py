@@ -0,0 +1,374 @@
+import os
+import glob
+import pickle
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Sheets read from every {country}.xlsx, in the order load_country_data returns them
+RATE_SHEETS = {
+    "acc": 'Accommodation Cost (Adults)',
+    "park": 'Park Fees',
+    "comm": 'Jaws Africa Commission',
+    "veh": 'Vehicle Cost',
+    "child": 'Children Rates Policy',
+}
+# Sheets a workbook may leave out, with the columns (and dtypes) of the empty frame used instead;
+# without a Children Rates Policy (e.g. Tanzania) children pay the adult rate
+OPTIONAL_SHEETS = {
+    "child": {"Location": "str", "Property": "str", "Age From": "int64", "Age To": "int64",
+              "Cost based on adult rates/Per Child": "str", "Form Factor": "float64"},
+}
+DATE_COLUMNS = {"acc": ('Date From', 'Date To'), "park": ('Dates From', 'Dates To')}
+# Repeated text columns are stored as categoricals (smaller sidecar, faster == filters)
+CATEGORY_COLUMNS = {
+    "acc": ['Location', 'Property', 'Room Type', 'Season'],
+    "park": ['Location', 'Travellers  Category'],
+    "child": ['Location', 'Property'],
+}
+
+# Where load_country_rates reads from: "files" ({country}.xlsx next to the app)
+# or "db" (the current rate version in Postgres, see import_rates.py)
+RATES_SOURCE = os.getenv("RATES_SOURCE", "files")
+# Seconds a version loaded from Postgres is used before checking whether a newer one was published
+RATES_DB_RECHECK = float(os.getenv("RATES_DB_RECHECK", "30"))
+
+# Compiled workbooks are pickled here so a fresh server process skips openpyxl
+CACHE_DIR = os.getenv("RATES_CACHE_DIR", ".rates_cache")
+# Bump when the compiled layout changes so old sidecars are ignored
+CACHE_FORMAT = 6
+# Accommodation rows are looked up per (Location, Property, Room Type), like the camp selectors
+ACC_KEY = ['Location', 'Property', 'Room Type']
+# Per person per night rate of each room type, in Single/Double/Triple order
+ACC_RATE_COLUMNS = [f"{room} (Cost Per Person/Per Night)" for room in ("Single", "Double", "Triple")]
+
+# Process-wide cache shared by every Streamlit session: abs path -> (stamp, tables)
+_tables = {}
+_tables_lock = threading.Lock()
+# Same for RATES_SOURCE=db: country -> (version id, checked at, tables)
+_db_tables = {}
+
+
+def _file_stamp(file_path):
+    info = os.stat(file_path)
+    return info.st_mtime_ns, info.st_size
+
+
+def _sidecar_path(file_path, stamp):
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(CACHE_DIR, f"{base}.v{CACHE_FORMAT}.{stamp[0]}.{stamp[1]}.pkl")
+
+
+def read_rate_sheets(file_path):
+    """The RATE_SHEETS of a workbook as read by pandas, keyed like RATE_SHEETS.
+
+    A missing OPTIONAL_SHEETS sheet comes back as an empty frame with its
+    usual columns; any other missing sheet raises ValueError.
+    """
+    xls = pd.ExcelFile(file_path)
+    sheets = {}
+    for key, sheet in RATE_SHEETS.items():
+        if sheet in xls.sheet_names:
+            sheets[key] = pd.read_excel(xls, sheet)
+        elif key in OPTIONAL_SHEETS:
+            sheets[key] = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in OPTIONAL_SHEETS[key].items()})
+        else:
+            raise ValueError(f"{os.path.basename(str(file_path))} has no '{sheet}' sheet")
+    return sheets
+
+
+def compile_workbook(file_path):
+    """Parses the rate sheets once and normalises their dtypes."""
+    return compile_tables(read_rate_sheets(file_path))
+
+
+def compile_tables(tables):
+    """Normalises the dtypes of raw rate sheets and builds the lookup indexes."""
+    tables = dict(tables)
+    for key, (start, end) in DATE_COLUMNS.items():
+        df = tables[key]
+        df[start] = pd.to_datetime(df[start])
+        df[end] = pd.to_datetime(df[end])
+    for key, columns in CATEGORY_COLUMNS.items():
+        df = tables[key]
+        for col in columns:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+    start, end = DATE_COLUMNS["acc"]
+    tables["acc_index"] = DateIntervalIndex(tables["acc"], ACC_KEY, start, end)
+    tables["park_index"] = ParkFeeIndex(tables["park"])
+    tables["child_index"] = child_factor_index(tables["child"])
+    tables["camp_index"] = camp_index(tables["acc"])
+    return tables
+
+
+_NO_SEGMENTS = (np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64))
+
+
+def stay_days(start_date, nights):
+    """Day numbers (days since epoch) of `nights` consecutive nights."""
+    first = np.datetime64(pd.Timestamp(start_date).date(), 'D')
+    return first.astype(np.int64) + np.arange(nights)
+
+
+class DateIntervalIndex:
+    """Season lookup over inclusive [Date From, Date To] ranges, per key.
+
+    Each key's seasons are cut into disjoint segments once, so a stay is
+    resolved with a single searchsorted call instead of a mask per night.
+    Where seasons overlap the first row in sheet order wins (same as the
+    old `.iloc[0]`) and the night is reported in `overlaps`.
+    """
+
+    def __init__(self, df, key_cols, start_col, end_col):
+        self.frame = df
+        self._segments = {}
+        starts_all = df[start_col].values.astype('datetime64[D]').astype(np.int64)
+        ends_all = df[end_col].values.astype('datetime64[D]').astype(np.int64)
+        for key, positions in df.groupby(key_cols, observed=True, sort=False).indices.items():
+            starts, ends = starts_all[positions], ends_all[positions]
+            # Segment boundaries: every season start and the day after every season end
+            bounds = np.unique(np.concatenate([starts, ends + 1]))
+            covering = (starts[None, :] <= bounds[:, None]) & (ends[None, :] >= bounds[:, None])
+            counts = covering.sum(axis=1)
+            # positions are in sheet order, so argmax picks the first matching row
+            rows = np.where(counts > 0, positions[covering.argmax(axis=1)], -1)
+            self._segments[key] = (bounds, rows, counts)
+
+    def keys(self):
+        return self._segments.keys()
+
+    def lookup(self, key, days):
+        """Row position (-1 for a gap) and match count for each day number."""
+        bounds, rows, counts = self._segments.get(key, _NO_SEGMENTS)
+        seg = np.searchsorted(bounds, days, side='right') - 1
+        inside = seg >= 0
+        night_rows = np.full(len(days), -1)
+        night_counts = np.zeros(len(days), dtype=np.int64)
+        night_rows[inside] = rows[seg[inside]]
+        night_counts[inside] = counts[seg[inside]]
+        return night_rows, night_counts
+
+    def changes(self, key, first_day, last_day):
+        """Day numbers in (first_day, last_day] on which the key's rate row changes (a season starts or ends)."""
+        bounds, rows, _ = self._segments.get(key, _NO_SEGMENTS)
+        previous = np.concatenate([[-1], rows[:-1]])
+        inside = (bounds > first_day) & (bounds <= last_day) & (rows != previous)
+        return bounds[inside]
+
+    def resolve(self, key, start_date, nights):
+        """Rate rows for `nights` consecutive nights from `start_date`.
+
+        Returns a dict with `dates` (every night), `rows` (the frame rows of
+        the covered nights, indexed by night), `gaps` (nights with no
+        season) and `overlaps` (nights covered by more than one season).
+        """
+        days = stay_days(start_date, nights)
+        dates = pd.to_datetime(days.astype('datetime64[D]'))
+        night_rows, night_counts = self.lookup(key, days)
+        covered = night_rows >= 0
+        found = self.frame.iloc[night_rows[covered]]
+        found.index = dates[covered]
+        return {
+            "dates": list(dates),
+            "rows": found,
+            "gaps": list(dates[~covered]),
+            "overlaps": list(dates[night_counts > 1]),
+        }
+
+
+class ParkFeeIndex:
+    """Park Fees keyed by (Location, Travellers Category, age band), each with its seasons.
+
+    Adults match any Adult band (the sheet only has 18-100); children must
+    fall inside the band's Age from/Age to. Sheets without age columns
+    (e.g. Tanzania) have one open band per category.
+    """
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        band_cols = ['Location', 'Travellers  Category']
+        if 'Age from' in df.columns:
+            band_cols += ['Age from', 'Age to']
+        start, end = DATE_COLUMNS["park"]
+        self.fees = df['Park Fee Per Night Per Person in USD'].to_numpy(dtype=float)
+        self._dates = DateIntervalIndex(df, band_cols, start, end)
+        # (location, category) -> [(age from, age to, band key)] in sheet order
+        self._bands = {}
+        for band in df[band_cols].drop_duplicates().itertuples(index=False):
+            band = tuple(band)
+            age_from, age_to = (band[2], band[3]) if len(band) > 2 else (-np.inf, np.inf)
+            self._bands.setdefault((band[0], band[1]), []).append((age_from, age_to, band))
+
+    def bands(self, loc, category):
+        return [(age_from, age_to) for age_from, age_to, _ in self._bands.get((loc, category), [])]
+
+    def changes(self, loc, first_day, last_day):
+        """Day numbers in (first_day, last_day] on which any of the location's fees change."""
+        days = [self._dates.changes(band, first_day, last_day)
+                for bands in (b for (l, _), b in self._bands.items() if l == loc) for _, _, band in bands]
+        return np.unique(np.concatenate(days)) if days else np.empty(0, np.int64)
+
+    def resolve(self, loc, dates, groups):
+        """Fees for a camp segment: an array of nights x groups, NaN where nothing matches.
+
+        `dates` are the segment's nights and `groups` a list of (category,
+        age) pairs, one per traveler; each distinct pair is looked up once.
+        """
+        days = pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int64)
+        nights = len(days)
+        columns = {}
+        for category, age in dict.fromkeys(groups):
+            fee = np.full(nights, np.nan)
+            for age_from, age_to, band in self._bands.get((loc, category), []):
+                if category != 'Adult' and not (age_from <= age <= age_to):
+                    continue
+                rows, _ = self._dates.lookup(band, days)
+                # First matching band in sheet order wins, like `.iloc[0]` did
+                fill = np.isnan(fee) & (rows >= 0)
+                fee[fill] = self.fees[rows[fill]]
+            columns[(category, age)] = fee
+        if not groups:
+            return np.empty((nights, 0))
+        return np.column_stack([columns[g] for g in groups])
+
+
+def camp_index(df):
+    """Accommodation properties as {location: {room type: [property, ...]}}.
+
+    Every level is in sorted order, so the camp selectors' options are a
+    dict lookup instead of filtering the frame per camp per rerun.
+    """
+    groups = df.groupby(ACC_KEY, observed=True, sort=False).indices
+    index = {}
+    for loc, prop, room in sorted(groups, key=lambda g: (str(g[0]), str(g[2]), str(g[1]))):
+        index.setdefault(str(loc), {}).setdefault(str(room), []).append(str(prop))
+    return index
+
+
+def child_factor_index(df):
+    """Children Rates Policy as {age: {property: form factor}}.
+
+    Bands are expanded to whole years once, so pricing a child is a pair of
+    dict lookups. Where bands overlap (e.g. 3-12 and 12-17) the first row in
+    sheet order wins, as the old DataFrame filter did.
+    """
+    index = {}
+    for prop, age_from, age_to, factor in zip(df['Property'], df['Age From'], df['Age To'], df['Form Factor']):
+        for age in range(int(age_from), int(age_to) + 1):
+            index.setdefault(age, {}).setdefault(str(prop), float(factor))
+    return index
+
+
+def _write_sidecar(path, tables):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        pickle.dump(tables, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    # Atomic swap so another process never reads a half-written file
+    os.replace(tmp_path, path)
+    base = os.path.basename(path).split(f".v{CACHE_FORMAT}.")[0]
+    for old in glob.glob(os.path.join(CACHE_DIR, f"{glob.escape(base)}.v*.pkl")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def load_rate_tables(file_path):
+    """Returns the compiled rate tables for a workbook.
+
+    Lookup order: in-process cache, then the pickled sidecar, then openpyxl.
+    All three are keyed by the workbook's mtime and size, so saving a new
+    version of the .xlsx is picked up on the next rerun.
+    """
+    abs_path = os.path.abspath(file_path)
+    stamp = _file_stamp(abs_path)
+    cached = _tables.get(abs_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    with _tables_lock:
+        cached = _tables.get(abs_path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        sidecar = _sidecar_path(abs_path, stamp)
+        tables = None
+        if os.path.exists(sidecar):
+            try:
+                with open(sidecar, "rb") as fh:
+                    tables = pickle.load(fh)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                tables = None
+        if tables is None:
+            tables = compile_workbook(abs_path)
+            try:
+                _write_sidecar(sidecar, tables)
+            except OSError:
+                # Read-only filesystem: keep the in-memory copy only
+                pass
+        _tables[abs_path] = (stamp, tables)
+    return tables
+
+
+def load_db_rate_tables(country):
+    """Compiled tables of the country's current rate version in Postgres, or None.
+
+    The whole version is loaded (one query per table) and compiled like a
+    workbook, so pricing runs on the same in-memory indexes in both modes
+    and never queries Postgres per trip. Each version is read and compiled
+    once per process; after
+    RATES_DB_RECHECK seconds the next call asks which version is current,
+    so a newly published version is picked up without a restart.
+    """
+    import database  # psycopg2 is only needed with RATES_SOURCE=db
+    cached = _db_tables.get(country)
+    if cached and time.monotonic() - cached[1] < RATES_DB_RECHECK:
+        return cached[2]
+
+    with _tables_lock:
+        cached = _db_tables.get(country)
+        if cached and time.monotonic() - cached[1] < RATES_DB_RECHECK:
+            return cached[2]
+        database.init_db()
+        current = database.current_rate_version(country)
+        if current is None:
+            _db_tables.pop(country, None)
+            return None
+        version_id = current[0]
+        if cached and cached[0] == version_id:
+            tables = cached[2]
+        else:
+            tables = compile_tables(database.load_rate_version(version_id))
+        _db_tables[country] = (version_id, time.monotonic(), tables)
+    return tables
+
+
+def available_countries(rates_dir=".", source=None):
+    """Countries that can be quoted from `source` (RATES_SOURCE by default)."""
+    if (source or RATES_SOURCE) == "db":
+        import database
+        database.init_db()
+        return database.rate_countries()
+    # Ignores temporary Excel owner files
+    return sorted(f[:-len('.xlsx')] for f in os.listdir(rates_dir)
+                  if f.endswith('.xlsx') and not f.startswith('~$'))
+
+
+def load_country_rates(country, rates_dir=".", source=None):
+    """Compiled rate tables of a country from `source` (RATES_SOURCE by default), or None."""
+    if (source or RATES_SOURCE) == "db":
+        return load_db_rate_tables(country)
+    file_path = os.path.join(rates_dir, f"{country}.xlsx")
+    if not os.path.exists(file_path):
+        return None
+    return load_rate_tables(file_path)
+
+
+def clear_rate_cache():
+    with _tables_lock:
+        _tables.clear()
+        _db_tables.clear()
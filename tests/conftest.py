@@ -0,0 +1,106 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pricing import PricingError, TravelerRegistry, build_itinerary, price_trip  # noqa: E402
+from rates import stay_days  # noqa: E402
+
+# Trip and quotation factories, shared by the tests (as fixtures) and bench.py
+TRIP_START = date(2026, 1, 5)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Workbooks, logo.png and the .docx template are read relative to the repo root
+    monkeypatch.chdir(ROOT)
+    return ROOT
+
+
+@pytest.fixture(scope="session")
+def kenya():
+    import rates
+    return rates.compile_workbook(os.path.join(ROOT, "Kenya.xlsx"))
+
+
+@pytest.fixture(scope="session", name="make_trip")
+def make_trip_fixture():
+    return make_trip
+
+
+@pytest.fixture(scope="session", name="bookable_camps")
+def bookable_camps_fixture():
+    return bookable_camps
+
+
+@pytest.fixture(scope="session", name="make_quote")
+def make_quote_fixture():
+    return make_quote
+
+
+def _child_ages(n_children):
+    return [(5, 10, 15)[i % 3] for i in range(n_children)]
+
+
+def _rooms_for(n_travelers):
+    """Doubles for everyone, plus a Single for an odd one out."""
+    ids = list(range(n_travelers))
+    rooms = {"Single": [], "Double": [ids[i:i + 2] for i in range(0, n_travelers - 1, 2)], "Triple": []}
+    if n_travelers % 2:
+        rooms["Single"].append([ids[-1]])
+    return rooms
+
+
+def bookable_camps(tables, nights):
+    """(loc, type, prop) keys that price cleanly for `nights` nights from TRIP_START."""
+    registry = TravelerRegistry.build(2, _child_ages(3), tables["child_index"])
+    days = stay_days(TRIP_START, nights)
+    good = []
+    for key in sorted(tables["acc_index"].keys(), key=str):
+        rows, _ = tables["acc_index"].lookup(key, days)
+        if (rows < 0).any():
+            continue
+        loc, prop, r_type = key
+        trip = {"start": TRIP_START, "end": TRIP_START + timedelta(days=nights), "vehicles": 1,
+                "travelers": registry, "extras": [],
+                "camps": [{"loc": loc, "type": r_type, "prop": prop, "nights": nights, "assignments": _rooms_for(5)}]}
+        try:
+            price_trip(tables, trip)
+        except PricingError:
+            continue
+        good.append({"loc": loc, "type": r_type, "prop": prop})
+    return good
+
+
+def make_trip(tables, camps, nights, n_travelers, n_camps):
+    """A trip of `nights` nights over `n_camps` camps; a quarter of the travelers are children."""
+    n_children = n_travelers // 4
+    registry = TravelerRegistry.build(n_travelers - n_children, _child_ages(n_children), tables["child_index"])
+    split = [nights // n_camps + (1 if i < nights % n_camps else 0) for i in range(n_camps)]
+    return {
+        "start": TRIP_START, "end": TRIP_START + timedelta(days=nights), "vehicles": max(1, -(-n_travelers // 6)),
+        "travelers": registry,
+        "camps": [{**camps[i % len(camps)], "nights": n, "assignments": _rooms_for(n_travelers)}
+                  for i, n in enumerate(split) if n],
+        "extras": [{"name": "Balloon", "a_price": 450.0, "c_price": 200.0, "dyn_c": False, "dyn_prices": {},
+                    "a_sel": [t.id for t in registry if t.category == "Adult"],
+                    "c_sel": [t.id for t in registry if t.category == "Child"]}],
+    }
+
+
+def make_quote(days, travelers):
+    """A Word/PDF quotation config with `days` itinerary rows and `travelers` price rows."""
+    camps = [{"loc": f"Park {i % 5}", "prop": f"Camp {i % 7} Lodge", "nights": 1} for i in range(max(1, days - 1))]
+    return {
+        "client": "Bench Client", "country": "Kenya", "code": "KEN-BEN-05012026",
+        "pkg": f"{days}D/{days - 1}N", "start": "05/01/2026", "end": "05/02/2026",
+        "iti": build_itinerary(camps, "Nairobi"),
+        "price_table": [{"Category": f"Adult {i + 1}", "Cost": 1500 + i} for i in range(travelers)],
+        "adults": travelers, "children_count": 0, "total": 1500 * travelers, "pp": 1500, "vehicles": -(-travelers // 6),
+        "accommodation_summary": "2 Double Room(s) at Camp 1 Lodge for 3 night(s)", "extras_summary": "Balloon",
+        "detailed_iti": [{"day": f"Day {i + 1}", "details": "Morning and afternoon game drives. " * 6} for i in range(days)],
+    }
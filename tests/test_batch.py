@@ -0,0 +1,124 @@
+import copy
+import csv
+import json
+
+import pytest
+
+import batch
+from pricing import PricingError
+
+ROOMS = {"Single": [["Adult 3"]], "Double": [["Adult 1", "Adult 2"], ["Child 1", "Child 2 (Age 12)"]]}
+SPEC = {
+    "id": "T1", "client": "Guest", "country": "Kenya", "start": "2026-06-13", "end": "2026-06-18",
+    "adults": 3, "children": [5, 12], "vehicles": 1,
+    "camps": [{"loc": "Masai Mara", "type": "Bush Tent", "prop": "Osero Sophia River Camp", "nights": 3, "rooms": ROOMS},
+              {"loc": "Lake Nakuru", "type": "Deluxe Room", "prop": "Lake Nakuru Lodge", "nights": 2, "rooms": ROOMS}],
+    "extras": [{"name": "Balloon", "a_price": 450, "a_sel": ["Adult 1"], "c_price": 0, "c_sel": [],
+                "dyn_c": False, "dyn_prices": {}}],
+}
+
+
+def spec(**changes):
+    out = copy.deepcopy(SPEC)
+    out.update(changes)
+    return out
+
+
+def problems(kenya, trip_spec):
+    with pytest.raises(PricingError) as err:
+        batch.build_trip(trip_spec, kenya)
+    return err.value.problems
+
+
+def test_valid_spec_prices():
+    summary, travelers = batch.price_spec(spec())
+    assert summary["status"] == "ok", summary["problems"]
+    assert summary["total"] == sum(row["total"] for row in travelers)
+    assert [row["label"] for row in travelers] == ["Adult 1", "Adult 2", "Adult 3", "Child 1 (Age 5)", "Child 2 (Age 12)"]
+
+
+def test_end_before_start(kenya):
+    assert problems(kenya, spec(start="2026-06-18", end="2026-06-13")) == ["End Date cannot be before Start Date"]
+
+
+def test_dates_accept_both_formats(kenya):
+    assert batch.build_trip(spec(start="13/06/2026", end="18/06/2026"), kenya)["start"] == \
+        batch.build_trip(spec(), kenya)["start"]
+    with pytest.raises(ValueError, match="Unrecognised date"):
+        batch.build_trip(spec(start="June 13"), kenya)
+
+
+def test_too_few_vehicles(kenya):
+    assert problems(kenya, spec(children=[5, 12, 6, 7, 8, 9]))[0] == \
+        "You need at least 2 vehicles for 9 seated travelers"
+
+
+def test_child_seats_count_towards_vehicles(kenya):
+    # Children on a lap need no seat: 3 adults + 2 seated children fit one vehicle
+    found = problems(kenya, spec(children=[5, 12, 1, 1, 2, 2], child_seats=2))
+    assert not any("vehicles" in problem for problem in found)
+
+
+def test_room_over_capacity_and_missing_travelers(kenya):
+    rooms = {"Single": [["Adult 3", "Adult 2"]], "Double": [["Child 1", "Child 2"]]}
+    trip_spec = spec()
+    trip_spec["camps"][0]["rooms"] = rooms
+    found = problems(kenya, trip_spec)
+    assert "Camp 1: Max 1 allowed for Single" in found
+    assert "Camp 1: every traveler must be in exactly one room" in found
+
+
+def test_nights_must_cover_the_trip(kenya):
+    assert "Camps cover 5 nights but the trip has 6" in problems(kenya, spec(end="2026-06-19"))
+
+
+def test_unknown_traveler(kenya):
+    trip_spec = spec()
+    trip_spec["extras"][0]["a_sel"] = ["Adult 7"]
+    assert problems(kenya, trip_spec) == ["Unknown traveler 'Adult 7'"]
+
+
+def test_auto_rooms_reports_unroomable_camps(kenya):
+    trip_spec = spec(adults=1, children=[5, 6, 7])
+    for camp in trip_spec["camps"]:
+        camp["rooms"] = "auto"
+    trip_spec["extras"] = []
+    found = problems(kenya, trip_spec)
+    assert len(found) == 2 and all(p.startswith(("Camp 1: No valid rooming", "Camp 2: No valid rooming")) for p in found)
+    assert batch.build_trip(dict(trip_spec, chaperone=False), kenya)["camps"][0]["assignments"]
+
+
+def test_price_spec_never_raises(tmp_path):
+    missing = batch.price_spec(spec(country="Atlantis"), rates_dir=str(tmp_path))[0]
+    assert missing["status"] == "error" and "No rate workbook" in missing["problems"]
+    broken = spec()
+    del broken["camps"][0]["nights"]
+    summary = batch.price_spec(broken)[0]
+    assert summary["status"] == "error" and summary["problems"].startswith("Invalid trip spec")
+
+
+def test_csv_and_json_inputs_agree(tmp_path):
+    json_path = tmp_path / "trips.json"
+    json_path.write_text(json.dumps({"trips": [SPEC]}))
+    csv_path = tmp_path / "trips.csv"
+    with open(csv_path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["id", "client", "country", "start", "end", "adults", "children", "vehicles",
+                         "loc", "type", "prop", "nights", "single", "double", "extras"])
+        for camp in SPEC["camps"]:
+            writer.writerow(["T1", "Guest", "Kenya", "2026-06-13", "2026-06-18", 3, "5;12", 1,
+                             camp["loc"], camp["type"], camp["prop"], camp["nights"],
+                             "Adult 3", "Adult 1+Adult 2|Child 1+Child 2 (Age 12)", json.dumps(SPEC["extras"])])
+    from_json = batch.price_spec(batch.read_trips(str(json_path))[0])
+    from_csv = batch.price_spec(batch.read_trips(str(csv_path))[0])
+    assert from_csv == from_json
+
+
+def test_cli_exit_code_reports_failures(tmp_path):
+    path = tmp_path / "trips.json"
+    path.write_text(json.dumps([SPEC, spec(id="T2", start="2026-06-18", end="2026-06-13")]))
+    out = tmp_path / "out"
+    assert batch.main([str(path), "--out", str(out), "--workers", "1"]) == 1
+    with open(out / "totals.csv", newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    assert [(row["id"], row["status"]) for row in rows] == [("T1", "ok"), ("T2", "error")]
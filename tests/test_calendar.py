@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pricing
+from pricing import PricingError
+
+
+@pytest.fixture(scope="module")
+def kenya_trip(kenya, make_trip, bookable_camps):
+    return make_trip(kenya, bookable_camps(kenya, 7), 7, 6, 3)
+
+
+def test_price_calendar_matches_price_trip(kenya, kenya_trip):
+    # The window runs past the end of the sheet's seasons, so some starts cannot be priced
+    result = pricing.price_calendar(kenya, kenya_trip, "2026-01-01", 400)
+    calendar = result["calendar"]
+    labels = [t.label for t in kenya_trip["travelers"]]
+    assert calendar["total"].notna().any() and calendar["total"].isna().any()
+    for start in calendar.index[::9]:
+        trip = dict(kenya_trip, start=start.date(), end=start.date() + timedelta(days=7))
+        try:
+            priced = pricing.price_trip(kenya, trip)
+        except PricingError:
+            assert np.isnan(calendar.loc[start, "total"]), start
+            continue
+        assert calendar.loc[start, "total"] == priced["total"], start
+        assert calendar.loc[start, labels].astype(int).tolist() == priced["travelers"]["total"].tolist(), start
+    assert result["cheapest"] == calendar["total"].idxmin()
+
+
+def test_price_calendar_boundaries_change_the_night_cost(kenya, kenya_trip):
+    boundaries = pricing.price_calendar(kenya, kenya_trip, "2026-01-01", 365)["boundaries"]
+    assert len(boundaries)
+    assert (boundaries["night before"].fillna(-1) != boundaries["night after"].fillna(-1)).all()
+    assert boundaries["date"].is_monotonic_increasing
+    assert set(boundaries["kind"]) <= {"season", "park fee"}
+    assert (boundaries["date"] >= pd.Timestamp("2026-01-01")).all()
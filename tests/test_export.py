@@ -0,0 +1,28 @@
+import os
+import zipfile
+
+import file
+
+
+def test_failed_quotes_are_reported_and_left_out(make_quote, monkeypatch, tmp_path):
+    monkeypatch.setattr(file, "EXPORT_DIR", str(tmp_path))
+    quotes = [("a.docx", make_quote(2, 1)), ("broken.docx", {"client": "Broken"}), ("b.docx", make_quote(3, 2))]
+    path, failed = file.build_export_zip(iter(quotes), total=3)
+    assert [name for name, _ in failed] == ["broken.docx"]
+    assert sorted(zipfile.ZipFile(path).namelist()) == ["a.docx", "b.docx"]
+
+
+def test_no_file_is_left_when_nothing_renders(monkeypatch, tmp_path):
+    monkeypatch.setattr(file, "EXPORT_DIR", str(tmp_path))
+    path, failed = file.build_export_zip(iter([("broken.docx", {"client": "Broken"})]), total=1)
+    assert path is None and len(failed) == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_stale_exports_are_swept(monkeypatch, tmp_path):
+    monkeypatch.setattr(file, "EXPORT_DIR", str(tmp_path))
+    stale = tmp_path / "old.zip"
+    stale.write_bytes(b"")
+    os.utime(stale, (0, 0))
+    file.build_export_zip(iter([]), total=0)
+    assert not stale.exists()
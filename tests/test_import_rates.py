@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+import import_rates
+import rates
+
+COUNTRY = "Testland"
+SINGLE = "Single (Cost Per Person/Per Night)"
+
+
+@pytest.fixture
+def database(monkeypatch):
+    # Needs a scratch database, like bench.py's BENCH_DATABASE_URL: rate versions are imported under COUNTRY
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set")
+    import database
+    monkeypatch.setattr(database, "DATABASE_URL", url)
+    database.close_pool()
+    database.init_db()
+    monkeypatch.setattr(rates, "RATES_DB_RECHECK", 0)
+    _drop_versions(database)
+    yield database
+    _drop_versions(database)
+    rates._db_tables.pop(COUNTRY, None)
+    database.close_pool()
+
+
+def _drop_versions(database):
+    with database.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM rate_versions WHERE country = %s", (COUNTRY,))
+        cur.close()
+
+
+@pytest.fixture
+def repriced(tmp_path):
+    """Kenya.xlsx with every Single rate $100 higher, as a second rate version."""
+    sheets = rates.read_rate_sheets("Kenya.xlsx")
+    sheets["acc"][SINGLE] += 100
+    path = tmp_path / "Repriced.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        for key, sheet in rates.RATE_SHEETS.items():
+            sheets[key].to_excel(writer, sheet_name=sheet, index=False)
+    return str(path)
+
+
+def single_total(tables):
+    return round(float(tables["acc"][SINGLE].sum()), 2)
+
+
+def test_import_stage_activate_and_roll_back(database, repriced, capsys):
+    assert import_rates.main(["Kenya.xlsx", "--country", COUNTRY, "--verify"]) == 0
+    assert database.current_rate_version(COUNTRY)[1] == 1
+    kenya = single_total(rates.load_db_rate_tables(COUNTRY))
+    assert kenya == single_total(rates.compile_workbook("Kenya.xlsx"))
+
+    # Staged: stored and verified, but readers stay on version 1
+    assert import_rates.main([repriced, "--country", COUNTRY, "--stage", "--verify"]) == 0
+    assert database.current_rate_version(COUNTRY)[1] == 1
+    assert single_total(rates.load_db_rate_tables(COUNTRY)) == kenya
+
+    assert import_rates.main(["--activate", COUNTRY, "2"]) == 0
+    assert database.current_rate_version(COUNTRY)[1] == 2
+    assert single_total(rates.load_db_rate_tables(COUNTRY)) == single_total(rates.compile_workbook(repriced))
+
+    assert import_rates.main(["--activate", COUNTRY, "1"]) == 0
+    assert single_total(rates.load_db_rate_tables(COUNTRY)) == kenya
+    versions = [(version, current) for country, version, _, current, _, _ in database.list_rate_versions(COUNTRY)]
+    assert versions == [(1, True), (2, False)]
+    assert "Testland version 1 is now current" in capsys.readouterr().out
+
+
+def test_activate_unknown_version_keeps_the_current_one(database, capsys):
+    assert import_rates.main(["Kenya.xlsx", "--country", COUNTRY]) == 0
+    assert import_rates.main(["--activate", COUNTRY, "7"]) == 1
+    assert "Testland has no rate version 7" in capsys.readouterr().err
+    assert database.current_rate_version(COUNTRY)[1] == 1
+
+
+def test_versions_read_back_unchanged(database, repriced):
+    for path in ("Kenya.xlsx", repriced):
+        country, version, problems = import_rates.import_workbook(path, COUNTRY, activate=False, verify=True)
+        assert problems == [], path
+    assert database.current_rate_version(COUNTRY) is None
+    assert COUNTRY not in database.rate_countries()
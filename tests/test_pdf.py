@@ -0,0 +1,26 @@
+import pytest
+
+import file
+
+
+@pytest.mark.parametrize("days, travelers", [(1, 1), (7, 4), (30, 40)])
+def test_pdf_carries_the_word_text(make_quote, days, travelers):
+    assert file.pdf_parity_problems(make_quote(days, travelers)) == []
+
+
+def test_pdf_parity_with_children_and_non_latin_text(make_quote):
+    q = make_quote(5, 3)
+    q.update(client="Zoë Ñandú – “VIP”", children_count=2, extras_summary="", price_table=None)
+    assert file.pdf_parity_problems(q) == []
+
+
+def test_pdf_parity_reports_missing_text(make_quote, monkeypatch):
+    q = make_quote(3, 2)
+    render = file._render_pdf
+
+    def drop_last_line(q):
+        pdf = render(q)
+        pdf.outline.pop()
+        return pdf
+    monkeypatch.setattr(file, "_render_pdf", drop_last_line)
+    assert file.pdf_parity_problems(q)
@@ -0,0 +1,153 @@
+import math
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import pricing
+from pricing import ROOM_TYPES, PricingError, TravelerRegistry
+
+
+class OldEngineError(Exception):
+    pass
+
+
+def old_engine(tables, trip):
+    """Per-traveler cost parts from the original per-night loop over the rate sheets.
+
+    A straight port of the calculation the app ran before price_trip
+    (DataFrame masks per night, first matching row wins), kept here as the
+    reference the vectorised engine must agree with.
+    """
+    df_acc, df_park, df_comm, df_veh, df_child_policy = (
+        tables[key] for key in ("acc", "park", "comm", "veh", "child"))
+    registry = trip["travelers"]
+    costs = {t.label: {"acc": 0.0, "park": 0.0, "veh": 0.0, "comm": 0.0, "extra": 0.0,
+                       "ff": 1.0 if t.category == "Adult" else 0.0} for t in registry}
+    calc_date = pd.Timestamp(trip["start"])
+    for camp in trip["camps"]:
+        camp_df = df_acc[(df_acc['Location'] == camp['loc']) & (df_acc['Room Type'] == camp['type'])
+                         & (df_acc['Property'] == camp['prop'])]
+        for _ in range(camp['nights']):
+            a_mask = (camp_df['Date From'] <= calc_date) & (camp_df['Date To'] >= calc_date)
+            if not a_mask.any():
+                raise OldEngineError(f"Rate not found for {camp['prop']} on {calc_date.date()}")
+            rate_row = camp_df[a_mask].iloc[0]
+            for r_type, rooms in camp['assignments'].items():
+                adult_rate_pp = float(rate_row[f"{r_type} (Cost Per Person/Per Night)"])
+                if rooms and (pd.isna(adult_rate_pp) or adult_rate_pp == 0):
+                    raise OldEngineError(f"Rate missing for {r_type} room at {camp['prop']}")
+                for room in rooms:
+                    for person in (registry[t] for t in room):
+                        if person.category == "Adult":
+                            costs[person.label]['acc'] += adult_rate_pp
+                            continue
+                        policy = df_child_policy[(df_child_policy['Property'] == camp['prop'])
+                                                 & (df_child_policy['Age From'] <= person.age)
+                                                 & (df_child_policy['Age To'] >= person.age)]
+                        factor = float(policy.iloc[0]['Form Factor']) if not policy.empty else 1.0
+                        costs[person.label]['acc'] += adult_rate_pp * factor
+                        costs[person.label]['ff'] = max(costs[person.label]['ff'], factor)
+
+            in_season = ((df_park['Location'] == camp['loc']) & (df_park['Dates From'] <= calc_date)
+                         & (df_park['Dates To'] >= calc_date))
+            adult_fees = df_park[in_season & (df_park['Travellers  Category'] == 'Adult')]
+            if adult_fees.empty:
+                raise OldEngineError(f"Adult park fee not found for {camp['loc']} on {calc_date.date()}")
+            for person in registry:
+                if person.category == "Adult":
+                    costs[person.label]['park'] += float(adult_fees.iloc[0]['Park Fee Per Night Per Person in USD'])
+                    continue
+                child_fees = df_park[in_season & (df_park['Travellers  Category'] == 'Child')
+                                     & (df_park['Age from'] <= person.age) & (df_park['Age to'] >= person.age)]
+                if child_fees.empty:
+                    raise OldEngineError(f"No park fee band for {person.label}")
+                costs[person.label]['park'] += float(child_fees.iloc[0]['Park Fee Per Night Per Person in USD'])
+            calc_date += timedelta(days=1)
+
+    total_days_veh = (pd.Timestamp(trip["end"]) - pd.Timestamp(trip["start"])).days + 1
+    total_v_cost = float(df_veh.iloc[0]['Cost in USD/Per Day']) * total_days_veh * trip["vehicles"]
+    paying = [label for label, d in costs.items() if d['ff'] > 0]
+    for label in paying:
+        costs[label]['veh'] = total_v_cost / len(paying)
+
+    comm_base = float(df_comm.iloc[0]['Commission Per Person (USD)'])
+    for d in costs.values():
+        d['comm'] = comm_base * d['ff']
+
+    for item in trip.get("extras", []):
+        if not item['name']:
+            continue
+        for c_id in item['c_sel']:
+            price = item['dyn_prices'].get(c_id, item['c_price']) if item['dyn_c'] else item['c_price']
+            costs[registry[c_id].label]['extra'] += price
+        for a_id in item['a_sel']:
+            costs[registry[a_id].label]['extra'] += item['a_price']
+    return costs
+
+
+def all_camps(tables):
+    camps = tables["acc"][["Location", "Room Type", "Property"]].drop_duplicates()
+    return [tuple(camp) for camp in camps.itertuples(index=False)]
+
+
+def random_trip(rng, tables):
+    camps = all_camps(tables)
+    registry = TravelerRegistry.build(rng.randint(1, 4), [rng.randint(0, 17) for _ in range(rng.randint(0, 3))],
+                                      tables["child_index"])
+    trip_camps = []
+    for loc, r_type, prop in rng.sample(camps, rng.randint(1, 3)):
+        ids = [t.id for t in registry]
+        rng.shuffle(ids)
+        assignments = {r: [] for r in ROOM_TYPES}
+        while ids:
+            size = rng.randint(1, min(3, len(ids)))
+            assignments[ROOM_TYPES[size - 1]].append(sorted(ids[:size]))
+            ids = ids[size:]
+        trip_camps.append({"loc": loc, "type": r_type, "prop": prop, "nights": rng.randint(1, 4),
+                           "assignments": assignments})
+    start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 360))
+    children = [t.id for t in registry if t.category == "Child"]
+    extras = [{"name": "Balloon", "a_price": 450.0, "c_price": 200.0, "dyn_c": rng.random() < 0.5,
+               "dyn_prices": {c: float(rng.randint(0, 300)) for c in children[:1]},
+               "a_sel": [t.id for t in registry if t.category == "Adult" and rng.random() < 0.7],
+               "c_sel": [c for c in children if rng.random() < 0.7]},
+              {"name": "", "a_price": 99.0, "c_price": 99.0, "dyn_c": False, "dyn_prices": {},
+               "a_sel": [0], "c_sel": []}]
+    return {"start": start, "end": start + timedelta(days=sum(c["nights"] for c in trip_camps)),
+            "vehicles": rng.randint(1, 2), "travelers": registry, "camps": trip_camps, "extras": extras}
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_price_trip_matches_old_engine(kenya, seed):
+    rng = random.Random(seed)
+    compared = 0
+    for _ in range(40):
+        trip = random_trip(rng, kenya)
+        try:
+            result = pricing.price_trip(kenya, trip)
+        except PricingError:
+            # The old loop raised too, or silently charged a child no park fee
+            continue
+        expected = old_engine(kenya, trip)
+        per = result["travelers"]
+        for label, parts in expected.items():
+            row = per[per["label"] == label].iloc[0]
+            for part in ("acc", "park", "veh", "comm", "extra"):
+                assert row[part] == pytest.approx(parts[part]), (seed, label, part)
+            assert row["total"] == math.ceil(parts["acc"] + parts["park"] + parts["veh"] + parts["comm"] + parts["extra"])
+        compared += 1
+    assert compared >= 10
+
+
+def test_price_trip_reports_missing_rates(kenya):
+    registry = TravelerRegistry.build(1, [], kenya["child_index"])
+    loc, r_type, prop = all_camps(kenya)[0]
+    start = date(2031, 1, 1)
+    trip = {"start": start, "end": start + timedelta(days=2), "vehicles": 1, "travelers": registry,
+            "camps": [{"loc": loc, "type": r_type, "prop": prop, "nights": 2,
+                       "assignments": {"Single": [[0]], "Double": [], "Triple": []}}]}
+    with pytest.raises(PricingError) as err:
+        pricing.price_trip(kenya, trip)
+    assert any("Rate not found" in problem for problem in err.value.problems)
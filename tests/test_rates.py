@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+import rates
+
+
+def test_workbook_without_children_policy_loads():
+    sheets = rates.read_rate_sheets("Tanzania.xlsx")
+    assert sheets["child"].empty
+    assert list(sheets["child"].columns) == list(rates.OPTIONAL_SHEETS["child"])
+    tables = rates.compile_tables(sheets)
+    assert tables["child_index"] == {}
+    assert tables["camp_index"]
+
+
+def test_missing_required_sheet_is_an_error(tmp_path):
+    sheets = rates.read_rate_sheets("Kenya.xlsx")
+    path = tmp_path / "Partial.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        sheets["acc"].to_excel(writer, sheet_name=rates.RATE_SHEETS["acc"], index=False)
+    with pytest.raises(ValueError, match="Park Fees"):
+        rates.read_rate_sheets(path)
@@ -0,0 +1,118 @@
+import itertools
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import pricing
+from pricing import ROOM_CAPACITY, ROOM_TYPES, PricingError, TravelerRegistry
+
+
+def partitions(items):
+    """Every way of splitting `items` into rooms of 1-3 people."""
+    if not items:
+        yield []
+        return
+    first, rest = items[0], items[1:]
+    for k in (1, 2, 3):
+        for others in itertools.combinations(rest, k - 1):
+            remaining = [x for x in rest if x not in others]
+            for part in partitions(remaining):
+                yield [(first,) + others] + part
+
+
+def brute_force(adults, children, stay_rates, chaperone):
+    """Cheapest cost over every rooming, or inf when none is allowed."""
+    factor = dict(children)
+    best = np.inf
+    for part in partitions(list(adults) + [c for c, _ in children]):
+        cost = 0.0
+        for room in part:
+            rate = stay_rates[ROOM_TYPES[len(room) - 1]]
+            if rate == np.inf or (chaperone and not any(t in adults for t in room)):
+                cost = np.inf
+                break
+            cost += sum(rate * factor.get(t, 1.0) for t in room)
+        best = min(best, cost)
+    return best
+
+
+def check_split(found, adults, children, chaperone):
+    split, _ = found
+    everyone = sorted(list(adults) + [c for c, _ in children])
+    assert sorted(t for rooms in split.values() for room in rooms for t in room) == everyone
+    for r_type, rooms in split.items():
+        for room in rooms:
+            assert len(room) == ROOM_CAPACITY[r_type]
+            if chaperone:
+                assert any(t in adults for t in room)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_cheapest_split_matches_brute_force(seed):
+    rng = random.Random(seed)
+    for _ in range(60):
+        n_adults, n_children = rng.randint(0, 4), rng.randint(0, 3)
+        if not n_adults + n_children:
+            continue
+        adults = list(range(n_adults))
+        children = [(n_adults + i, rng.choice([0.0, 0.5, 0.75, 1.0])) for i in range(n_children)]
+        stay_rates = {r: rng.choice([np.inf, 80.0, 100.0, 120.0, 150.0]) for r in ROOM_TYPES}
+        chaperone = rng.random() < 0.6
+        expected = brute_force(adults, children, stay_rates, chaperone)
+        found = pricing._cheapest_split(adults, children, stay_rates, chaperone)
+        if expected == np.inf:
+            assert found is None, (adults, children, stay_rates, chaperone)
+        else:
+            assert found is not None and found[1] == pytest.approx(expected), (adults, children, stay_rates, chaperone)
+            check_split(found, adults, children, chaperone)
+
+
+def test_chaperone_keeps_children_with_adults():
+    stay_rates = {"Single": 50.0, "Double": 100.0, "Triple": 100.0}
+    # Alone in a Single the child is cheapest, but never unaccompanied
+    split, cost = pricing._cheapest_split([0], [(1, 0.5)], stay_rates, chaperone=True)
+    assert split["Double"] == [[0, 1]] and cost == pytest.approx(150.0)
+    split, cost = pricing._cheapest_split([0], [(1, 0.5)], stay_rates, chaperone=False)
+    assert split["Single"] == [[0], [1]] and cost == pytest.approx(75.0)
+    assert pricing._cheapest_split([], [(0, 0.5)], stay_rates, chaperone=True) is None
+    assert pricing._cheapest_split([0], [(1, 0.5), (2, 0.5), (3, 0.5)], stay_rates, chaperone=True) is None
+
+
+def test_auto_assign_rooms_matches_brute_force(kenya):
+    start = date(2026, 6, 13)
+    camps = [{"loc": loc, "type": r_type, "prop": prop, "nights": 2}
+             for loc, types in kenya["camp_index"].items() for r_type, props in types.items() for prop in props]
+    rng = random.Random(7)
+    checked = 0
+    while checked < 25:
+        trip_camps = rng.sample(camps, 2)
+        registry = TravelerRegistry.build(rng.randint(1, 3), [rng.randint(0, 17) for _ in range(rng.randint(0, 3))],
+                                          kenya["child_index"])
+        trip = {"start": start, "travelers": registry, "camps": trip_camps}
+        try:
+            stays = [pricing._stay_rates(kenya, camp, start + timedelta(days=2 * i)) for i, camp in enumerate(trip_camps)]
+            assigned = pricing.auto_assign_rooms(kenya, trip)
+        except PricingError:
+            continue
+        adults = [t.id for t in registry if t.category == "Adult"]
+        for camp, stay, assignments in zip(trip_camps, stays, assigned):
+            children = [(t.id, t.factor_at(camp["prop"])) for t in registry if t.category != "Adult"]
+            check_split((assignments, None), adults, children, chaperone=True)
+            cost = sum(stay[r] * registry[t].factor_at(camp["prop"])
+                       for r, rooms in assignments.items() for room in rooms for t in room)
+            assert cost == pytest.approx(brute_force(adults, children, stay, chaperone=True))
+        checked += 1
+
+
+def test_auto_assign_rooms_reports_unroomable_camps(kenya):
+    start = date(2026, 6, 13)
+    camps = [{"loc": loc, "type": r_type, "prop": prop, "nights": 1}
+             for loc, types in kenya["camp_index"].items() for r_type, props in types.items() for prop in props]
+    camp = next(c for c in camps if all(v < np.inf for v in pricing._stay_rates(kenya, c, start).values()))
+    registry = TravelerRegistry.build(0, [8], kenya["child_index"])
+    trip = {"start": start, "travelers": registry, "camps": [camp]}
+    with pytest.raises(PricingError, match="No valid rooming for Child 1"):
+        pricing.auto_assign_rooms(kenya, trip)
+    assert pricing.auto_assign_rooms(kenya, trip, chaperone=False) == [{"Single": [[0]], "Double": [], "Triple": []}]
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Rolling window per span name for the p50/p95 columns
+HISTORY_SIZE = 200
+
+# The recorder of the rerun running on this thread (Streamlit runs each
+# session's script on its own thread); None means timing is off.
+_local = threading.local()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """Spans of one rerun, also appended to a rolling `history` {name: deque of ms}."""
+
+    def __init__(self, history=None):
+        self.spans = []
+        self.history = history if history is not None else {}
+
+    def add(self, name, ms):
+        self.spans.append((name, ms))
+        self.history.setdefault(name, deque(maxlen=HISTORY_SIZE)).append(ms)
+
+    def summary(self):
+        """One row per span name seen this rerun or before, slowest p95 first."""
+        this_rerun = {}
+        for name, ms in self.spans:
+            calls, total = this_rerun.get(name, (0, 0.0))
+            this_rerun[name] = (calls + 1, total + ms)
+        rows = []
+        for name, samples in self.history.items():
+            calls, total = this_rerun.get(name, (0, 0.0))
+            rows.append({"span": name, "calls": calls, "rerun ms": round(total, 1),
+                         "p50 ms": round(_percentile(samples, 50), 1), "p95 ms": round(_percentile(samples, 95), 1),
+                         "samples": len(samples)})
+        return sorted(rows, key=lambda row: row["p95 ms"], reverse=True)
+
+
+def activate(recorder):
+    """Records this thread's spans into `recorder` (None turns timing off)."""
+    _local.recorder = recorder
+
+
+def span(name):
+    """Context manager timing a block; a shared no-op when timing is off."""
+    recorder = getattr(_local, "recorder", None)
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name)
+
+
+def timed(name=None):
+    """Decorator form of span(), named after the function by default."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorder = getattr(_local, "recorder", None)
+            if recorder is None:
+                return fn(*args, **kwargs)
+            with _Span(recorder, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate